@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Benchmark the InstaGIMP plug-ins offline.
+
+Runs the unmodified plug-in procedures against fakegimpfu over a matrix of
+image sizes and channel counts, and reports megapixels per second and peak
+memory. Every filter is also run on a small deterministic image whose result
+is compared with the golden images stored in benchmarks/golden, so that a
+faster path cannot silently change the output. The golden images are the
+output of the original per-pixel plug-ins on that image. On other images
+the filters may differ from those loops by one level on a few pixels: the
+lookup tables and the distance map round differently where a value is
+within floating point error of an integer, which int() then truncates.
+
+    python benchmarks/bench.py
+    python benchmarks/bench.py --sizes 640x480,3000x2000 --filters chicago,geneva
+    python benchmarks/bench.py --update-golden
+    python benchmarks/bench.py --copies --sizes 2048x1536
+    python benchmarks/bench.py --channels rgba,sticker
+
+--copies adds the buffers allocated and the bytes copied between the pixel
+regions and NumPy per megapixel, which stay at zero copies with fakegimpfu
+as its regions take buffers.
+"""
+
+from __future__ import print_function
+
+import argparse
+import glob
+import gc
+import os
+import re
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import fakegimpfu
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+    import resource
+
+GOLDEN_DIR = os.path.join(HERE, "golden")
+GOLDEN_SIZE = (64, 48)
+# The sticker golden images span several tiles, fully transparent and
+# uniform ones among them, see luts.pack_tiles().
+STICKER_SIZE = (256, 192)
+CHANNELS = {"rgb": 3, "rgba": 4}
+
+# Benchmark only kind: an RGBA cutout, transparent but for a centered
+# rectangle a quarter of the layer, half of it a flat color.
+STICKER = "sticker"
+
+
+def load_plugins(names=None):
+    """Run the plug-in files against fakegimpfu, return {name: (function, params)}."""
+    fakegimpfu.install()
+    plugins = {}
+    for path in sorted(glob.glob(os.path.join(ROOT, "instagimp_*.py"))):
+        fakegimpfu.procedures.clear()
+        # Not runpy.run_path(), which on Python 2 sets the globals of the
+        # plug-in to None once it returns, breaking the procedures it
+        # registered. Their functions keep this namespace alive instead.
+        namespace = {"__name__": "__main__", "__file__": path}
+        with open(path) as f:
+            exec(compile(f.read(), path, "exec"), namespace)
+        for proc_name, procedure in fakegimpfu.procedures.items():
+            name = proc_name[len("python_fu_instagimp_"):]
+            if names is None or name in names:
+                plugins[name] = procedure
+    return plugins
+
+
+def test_image(width, height, bpp, sticker=False):
+    """Deterministic test pixels: gradients plus pseudo-random noise.
+
+    With sticker, alpha is 0 outside of a centered rectangle of half the
+    width and height, whose right half is a single opaque color.
+    """
+    data = bytearray(width * height * bpp)
+    seed = 12345
+    i = 0
+    for y in range(height):
+        for x in range(width):
+            seed = (seed * 1103515245 + 12345) & 0x7fffffff
+            noise = (seed >> 16) & 0x3f
+            data[i] = (x * 255 // max(1, width - 1) + noise) & 0xff
+            data[i + 1] = (y * 255 // max(1, height - 1) + noise) & 0xff
+            data[i + 2] = ((x + y) * 255 // max(1, width + height - 2) + 2 * noise) & 0xff
+            if bpp == 4:
+                data[i + 3] = (seed >> 8) & 0xff
+            if sticker:
+                inside = width // 4 <= x < 3 * width // 4 and height // 4 <= y < 3 * height // 4
+                if inside and x >= width // 2:
+                    data[i:i + 4] = bytearray((200, 120, 40, 255))
+                elif not inside:
+                    data[i + 3] = 0
+            i += bpp
+    return data
+
+
+def run(procedure, width, height, bpp, data):
+    """Run a procedure on a fresh layer, returns (layer, seconds)."""
+    function, params = procedure
+    layer = fakegimpfu.Layer(width, height, bpp, data)
+    image = fakegimpfu.Image([layer])
+    start = time.time()
+    function(image, layer, *fakegimpfu.defaults(params))
+    return layer, time.time() - start
+
+
+def measure(procedure, width, height, bpp, data):
+    """Run a procedure, returns (seconds, peak memory in MB)."""
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        layer, seconds = run(procedure, width, height, bpp, data)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    else:
+        layer, seconds = run(procedure, width, height, bpp, data)
+        # Process high-water mark, in kB on Linux.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return seconds, peak / float(1 << 20)
+
+
+# Golden images are stored as PAM files, readable without any dependency.
+
+# Suffix of the procedures running a filter over several layers.
+VARIANT = re.compile("_(frames|all)$")
+
+def golden_cases():
+    """(kind, bpp, width, height, sticker) of the golden images."""
+    cases = [(kind, bpp) + GOLDEN_SIZE + (False,) for kind, bpp in sorted(CHANNELS.items())]
+    return cases + [(STICKER, 4) + STICKER_SIZE + (True,)]
+
+
+def golden_path(name, kind):
+    # On a single layer image, the all frames and all layers variants give
+    # the same result as the filter.
+    name = VARIANT.sub("", name)
+    return os.path.join(GOLDEN_DIR, "%s_%s.pam" % (name, kind))
+
+
+def write_pam(path, width, height, bpp, data):
+    with open(path, "wb") as f:
+        f.write(("P7\nWIDTH %d\nHEIGHT %d\nDEPTH %d\nMAXVAL 255\nTUPLTYPE %s\nENDHDR\n"
+                 % (width, height, bpp, "RGB_ALPHA" if bpp == 4 else "RGB")).encode("ascii"))
+        f.write(bytes(data))
+
+
+def read_pam(path):
+    with open(path, "rb") as f:
+        fields = {}
+        f.readline()
+        while True:
+            line = f.readline().split()
+            if line[0] == b"ENDHDR":
+                break
+            fields[line[0]] = line[1]
+        return int(fields[b"WIDTH"]), int(fields[b"HEIGHT"]), int(fields[b"DEPTH"]), bytearray(f.read())
+
+
+def check_golden(plugins, update=False):
+    """Compare every filter with its golden images, returns the failures."""
+    failures = []
+    for name in sorted(plugins):
+        for kind, bpp, width, height, sticker in golden_cases():
+            layer, _ = run(plugins[name], width, height, bpp, test_image(width, height, bpp, sticker))
+            path = golden_path(name, kind)
+            if update and VARIANT.search(name):
+                continue
+            if update:
+                write_pam(path, width, height, bpp, layer.data)
+                print("wrote %s" % os.path.relpath(path, ROOT))
+                continue
+            if not os.path.exists(path):
+                failures.append((name, kind, "missing golden image"))
+                continue
+            golden = read_pam(path)
+            if golden[:3] != (width, height, bpp):
+                failures.append((name, kind, "golden image has a different shape"))
+                continue
+            diff = [abs(a - b) for a, b in zip(layer.data, golden[3]) if a != b]
+            if diff:
+                failures.append((name, kind, "%d values differ, by up to %d" % (len(diff), max(diff))))
+    return failures
+
+
+def parse_sizes(text):
+    return [tuple(int(v) for v in size.split("x")) for size in text.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=parse_sizes, default=parse_sizes("256x256,1024x768,2048x1536"),
+                        help="comma separated WIDTHxHEIGHT list (default: 256x256,1024x768,2048x1536)")
+    parser.add_argument("--filters", help="comma separated filters (default: all)")
+    parser.add_argument("--channels", default="rgb,rgba",
+                        help="comma separated rgb, rgba and sticker, a sparse RGBA layer (default: rgb,rgba)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case, the best one is reported")
+    parser.add_argument("--update-golden", action="store_true", help="rewrite the golden images and exit")
+    parser.add_argument("--no-golden", action="store_true", help="skip the golden image comparison")
+    parser.add_argument("--copies", action="store_true",
+                        help="report the allocations and copies of the region bridge per megapixel")
+    args = parser.parse_args(argv)
+    if args.copies:
+        from instagimp import bridge
+
+    plugins = load_plugins(args.filters.split(",") if args.filters else None)
+    if args.update_golden:
+        check_golden(plugins, update=True)
+        return 0
+
+    header = "%-19s %11s %5s %9s %9s %9s" % ("filter", "size", "chan", "seconds", "MP/s", "peak MB")
+    print(header + (" %9s %9s" % ("allocs/MP", "MBcp/MP") if args.copies else ""))
+    for name in sorted(plugins):
+        for width, height in args.sizes:
+            for kind in args.channels.split(","):
+                bpp = CHANNELS.get(kind, 4)
+                data = test_image(width, height, bpp, kind == STICKER)
+                if args.copies:
+                    bridge.counters.reset()
+                runs = [measure(plugins[name], width, height, bpp, data) for _ in range(args.repeat)]
+                seconds = min(run[0] for run in runs)
+                peak = max(run[1] for run in runs)
+                line = "%-19s %11s %5s %9.3f %9.2f %9.1f" % (name, "%dx%d" % (width, height), kind, seconds,
+                                                             width * height / 1e6 / max(seconds, 1e-9), peak)
+                if args.copies:
+                    allocations, allocated, copied = bridge.counters.per_megapixel(width * height * args.repeat)
+                    line += " %9.1f %9.2f" % (allocations, copied / float(1 << 20))
+                print(line)
+
+    if args.no_golden:
+        return 0
+    failures = check_golden(plugins)
+    for name, kind, reason in failures:
+        print("golden %s %s: %s" % (name, kind, reason))
+    print("golden images: %s" % ("FAILED" if failures else "ok"))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
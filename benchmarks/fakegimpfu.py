@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""In-memory stand-in for gimpfu, enough to run the plug-ins offline.
+
+Install it with install() before running a plug-in file: register() records
+the procedures instead of talking to GIMP and main() does nothing. Layers
+keep their pixels in a bytearray and support both get_pixel()/set_pixel()
+and pixel regions with a shadow buffer.
+"""
+
+import sys
+
+PF_INT8, PF_INT16, PF_INT32, PF_INT, PF_FLOAT, PF_STRING, PF_VALUE = range(7)
+PF_COLOR, PF_COLOUR, PF_IMAGE, PF_LAYER, PF_CHANNEL, PF_DRAWABLE = 7, 7, 8, 9, 10, 11
+PF_TOGGLE, PF_BOOL, PF_SLIDER, PF_SPINNER, PF_ADJUSTMENT, PF_FONT, PF_FILE, PF_OPTION, PF_RADIO = range(12, 21)
+
+# Procedures recorded by register(), by name.
+procedures = {}
+
+
+class Color(object):
+    """Stand-in for gimpcolor.RGB, indexing gives 0..255 integers."""
+
+    def __init__(self, r, g, b, a=1.0):
+        self.r, self.g, self.b, self.a = r, g, b, a
+
+    def __getitem__(self, i):
+        return int(round((self.r, self.g, self.b, self.a)[i] * 255.0))
+
+    def __len__(self):
+        return 4
+
+
+class PixelRgn(object):
+
+    def __init__(self, layer, x, y, width, height, dirty, shadow):
+        self.layer = layer
+        self.x, self.y, self.w, self.h = x, y, width, height
+        self.shadow = shadow
+
+    def _rows(self, key):
+        xs, ys = key
+        return xs.start, xs.stop, ys.start, ys.stop
+
+    def __getitem__(self, key):
+        x0, x1, y0, y1 = self._rows(key)
+        layer, bpp = self.layer, self.layer.bpp
+        data = layer.shadow_data if self.shadow else layer.data
+        stride = layer.width * bpp
+        if x0 == 0 and x1 == layer.width:
+            return bytes(data[y0 * stride:y1 * stride])
+        return b"".join(bytes(data[y * stride + x0 * bpp:y * stride + x1 * bpp]) for y in range(y0, y1))
+
+    def __setitem__(self, key, value):
+        x0, x1, y0, y1 = self._rows(key)
+        layer, bpp = self.layer, self.layer.bpp
+        data = layer.shadow_data if self.shadow else layer.data
+        stride, row = layer.width * bpp, (x1 - x0) * bpp
+        if x0 == 0 and x1 == layer.width:
+            data[y0 * stride:y1 * stride] = value
+            return
+        for i, y in enumerate(range(y0, y1)):
+            data[y * stride + x0 * bpp:y * stride + x1 * bpp] = value[i * row:(i + 1) * row]
+
+
+class Layer(object):
+
+    def __init__(self, width, height, bpp, data=None, name="Background", has_alpha=None):
+        self.width, self.height, self.bpp, self.name = width, height, bpp, name
+        self.has_alpha = bpp in (2, 4) if has_alpha is None else has_alpha
+        self.data = bytearray(data) if data is not None else bytearray(width * height * bpp)
+        self.shadow_data = bytearray(len(self.data))
+        self.updates = []
+        self.image = None
+        self.offsets = (0, 0)
+        self.visible = True
+        self.is_rgb = bpp not in (1, 2)
+
+    def _selection(self):
+        return None if self.image is None else self.image.selection
+
+    @property
+    def mask_bounds(self):
+        """(x1, y1, x2, y2) of the selection in the layer, the whole layer without one."""
+        selection = self._selection()
+        if selection is None:
+            return 0, 0, self.width, self.height
+        ox, oy = self.offsets
+        xs, ys = [], []
+        for y in range(self.height):
+            for x in range(self.width):
+                if selection.get_pixel(x + ox, y + oy)[0]:
+                    xs.append(x)
+                    ys.append(y)
+        if not xs:
+            return 0, 0, self.width, self.height
+        return min(xs), min(ys), max(xs) + 1, max(ys) + 1
+
+    def get_pixel(self, x, y):
+        i = (y * self.width + x) * self.bpp
+        return tuple(self.data[i:i + self.bpp])
+
+    def set_pixel(self, x, y, pixel):
+        i = (y * self.width + x) * self.bpp
+        self.data[i:i + self.bpp] = bytearray(pixel)
+
+    def get_pixel_rgn(self, x, y, width, height, dirty=True, shadow=False):
+        return PixelRgn(self, x, y, width, height, dirty, shadow)
+
+    def flush(self):
+        pass
+
+    def merge_shadow(self, undo=True):
+        # Like GIMP, only the selection bounds are merged, blended by the selection.
+        selection = self._selection()
+        x1, y1, x2, y2 = self.mask_bounds
+        ox, oy = self.offsets
+        for y in range(y1, y2):
+            i, j = (y * self.width + x1) * self.bpp, (y * self.width + x2) * self.bpp
+            if selection is None:
+                self.data[i:j] = self.shadow_data[i:j]
+                continue
+            for x in range(x1, x2):
+                m = selection.get_pixel(x + ox, y + oy)[0]
+                for k in range(i + (x - x1) * self.bpp, i + (x - x1 + 1) * self.bpp):
+                    self.data[k] = (self.data[k] * (255 - m) + self.shadow_data[k] * m + 127) // 255
+
+    def update(self, x, y, width, height):
+        self.updates.append((x, y, width, height))
+
+
+class LayerGroup(object):
+    """Layer group of layers and other groups, it has no pixels of its own."""
+
+    def __init__(self, layers, name="Group"):
+        self.layers = list(layers)
+        self.name = name
+        self.image = None
+        self.offsets = (0, 0)
+        self.visible = True
+
+
+class Image(object):
+    """Image of layers, selection is a one byte per pixel Layer or None."""
+
+    def __init__(self, layers, selection=None, width=None, height=None, precision=None):
+        self.layers = list(layers)
+        self.selection = selection
+        self.width = width or self.layers[0].width
+        self.height = height or self.layers[0].height
+        self.name = "Untitled"
+        self.precision = precision
+        self.active_layer = self.layers[0] if self.layers else None
+        layers = list(self.layers)
+        while layers:
+            layer = layers.pop()
+            layer.image = self
+            layers.extend(getattr(layer, "layers", []))
+
+
+class _Gimp(object):
+
+    def __init__(self):
+        self.messages = []
+        self.images = []
+
+    def image_list(self):
+        return list(self.images)
+
+    def progress_init(self, message=None):
+        pass
+
+    def progress_update(self, fraction):
+        pass
+
+    def message(self, text):
+        self.messages.append(text)
+        sys.stderr.write("gimp.message: %s\n" % text)
+
+    def tile_width(self):
+        return 64
+
+    def tile_height(self):
+        return 64
+
+
+class _Pdb(object):
+    """Accepts any procedure call and does nothing."""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+gimp = _Gimp()
+pdb = _Pdb()
+
+
+def register(proc_name, blurb, help, author, copyright, date, label, imagetypes, params, results, function,
+             **kwargs):
+    procedures[proc_name] = (function, params)
+
+
+def main():
+    pass
+
+
+def defaults(params):
+    """Default arguments of a registered parameter list."""
+    values = []
+    for param in params:
+        value = param[3]
+        if param[0] == PF_COLOR and not isinstance(value, Color):
+            value = Color(*value)
+        values.append(value)
+    return values
+
+
+def install():
+    """Make "from gimpfu import *" resolve to this module."""
+    module = sys.modules[__name__]
+    sys.modules["gimpfu"] = module
+    return module
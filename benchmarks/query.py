@@ -0,0 +1,92 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Measure what the plug-ins cost GIMP at startup.
+
+GIMP runs every plug-in file in its own process to query the procedures it
+registers, at startup and whenever pluginrc is refreshed. This runs each
+file the same way against fakegimpfu, in a fresh interpreter, and reports
+the wall time of the process, the procedures registered and whether NumPy
+got imported. Pass the files of another layout to compare, e.g. the ones
+of an older checkout:
+
+    python benchmarks/query.py
+    python benchmarks/query.py --repeat 20 /tmp/old/instagimp_*.py
+"""
+
+from __future__ import print_function
+
+import argparse
+import glob
+import os
+import runpy
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+
+def child(path):
+    """Query one plug-in file in this process, print its procedures and NumPy use."""
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, HERE)
+    import fakegimpfu
+    fakegimpfu.install()
+    runpy.run_path(path)
+    print(len(fakegimpfu.procedures), int("numpy" in sys.modules))
+
+
+def query(path):
+    """Run the query of one file in a new interpreter, returns (seconds, procedures, numpy)."""
+    start = time.time()
+    out = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--child", path])
+    seconds = time.time() - start
+    procedures, numpy = out.split()
+    return seconds, int(procedures), bool(int(numpy))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("files", nargs="*", help="plug-in files (default: the ones of this checkout)")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="queries per file, the best counts")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        child(args.child)
+        return 0
+
+    files = args.files or sorted(glob.glob(os.path.join(ROOT, "instagimp_*.py")))
+    total, count = 0.0, 0
+    for path in files:
+        runs = [query(path) for _ in range(args.repeat)]
+        seconds = min(run[0] for run in runs)
+        procedures, numpy = runs[0][1:]
+        total += seconds
+        count += procedures
+        print("%-28s %7.1f ms  %2d procedures%s"
+              % (os.path.basename(path), 1000 * seconds, procedures, "  (imports NumPy)" if numpy else ""))
+    print("%d files, %d procedures: %.1f ms" % (len(files), count, 1000 * total))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
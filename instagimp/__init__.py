@@ -0,0 +1,25 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Shared code for the InstaGIMP filters.
+
+Nothing in this package imports gimpfu, so the filters can also run outside
+of GIMP.
+"""
@@ -0,0 +1,320 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Sharded, resumable batch runs over a manifest of images.
+
+A manifest lists one item per line, either the path of an input, filtered
+with the default filter and parameters of the run into the same relative
+path under the output directory, or a JSON object
+
+    {"input": "2009/0412.jpg", "output": "graded/0412.png",
+     "filter": "geneva", "params": {"blackoutside": 80}}
+
+whose output, filter and params are optional, params overriding the
+default parameters when the filter is the default one. Inputs are relative
+to the directory of the manifest, outputs to the output directory, which
+they may not leave, and two items may not have the same output. Blank lines
+and lines starting with # are skipped.
+
+Each worker of a run is given its shard as index/count and takes the items
+whose output path, relative to the output directory, hashes to its index,
+so the shards do not depend on the order of the manifest, on which machine
+runs them or where it mounts the output directory, and items appended to
+the manifest do not move others to another shard. Outputs are written to a
+temporary file next to them and renamed into place, so they are either
+complete or missing. Every finished item is then appended to the journal
+of the worker with the signature of its filter and parameters, and a
+restarted worker skips the items of its journal whose output exists and
+whose signature did not change. Two workers must not run the same shard at
+once. Nothing but the files is shared, several local processes and a
+directory stand in for a cluster:
+
+    for i in 0 1 2 3; do
+        python -m instagimp batch archive.txt --shard $i/4 -f chicago -o /shared/out &
+    done; wait
+"""
+
+from __future__ import print_function
+
+import errno
+import hashlib
+import json
+import os
+
+from . import diskcache, images, kernels, parallel
+
+_replace = getattr(os, "replace", os.rename)
+
+# Items in flight per worker process of a shard.
+WINDOW = 4
+
+
+def parse_shard(text):
+    """Parse INDEX/COUNT into (index, count), with 0 <= index < count."""
+    index, sep, count = text.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError("expected a shard as INDEX/COUNT, got %r" % text)
+    if not sep or count < 1 or not 0 <= index < count:
+        raise ValueError("expected a shard as INDEX/COUNT with 0 <= INDEX < COUNT, got %r" % text)
+    return index, count
+
+
+def shard_of(name, count):
+    """Shard of an item named name among count, stable across runs and machines."""
+    return int(hashlib.sha1(name.encode("utf-8")).hexdigest()[:15], 16) % count
+
+
+class Item(object):
+    """One image of a manifest: input and output paths, filter name and params.
+
+    params are complete with the filter defaults, label is their
+    diskcache.signature(). Items are identified by name, their output path
+    relative to the output directory.
+    """
+
+    def __init__(self, input, output, filter, params, name):
+        self.input, self.output, self.filter = input, output, filter
+        self.params = params
+        self.name = name
+        self.label = diskcache.signature(kernels.FILTERS[filter], params)
+
+    def __repr__(self):
+        return "Item(%r -> %r, %s)" % (self.input, self.output, self.label)
+
+
+def _params(filter, values):
+    """Parameters of filter with values overriding its defaults.
+
+    Every value, defaults included, is made a float, and sequences tuples
+    of floats, like kernels.parse_params() does, so that the same
+    parameters given in the manifest, on the command line or left to their
+    defaults are passed and journaled the same.
+    """
+    params = kernels.parse_params(filter, [])
+    for key in values:
+        if key not in params:
+            raise ValueError("unknown parameter %r for %s, expected one of %s" % (key, filter, ", ".join(params)))
+    params.update(values)
+    for key, value in params.items():
+        try:
+            value = tuple(float(x) for x in value) if isinstance(value, (tuple, list)) else float(value)
+        except (TypeError, ValueError):
+            raise ValueError("bad value %r for parameter %s of %s" % (value, key, filter))
+        params[key] = kernels.check_value(filter, key, value)
+    return params
+
+
+def output_name(input, extension=None):
+    """Output of a manifest input relative to the output directory: the same
+    relative path, with extension.
+
+    Leading .. are dropped, read_manifest() rejects the outputs of two
+    inputs that end up the same.
+    """
+    relative = os.path.splitdrive(os.path.normpath(input))[1].lstrip(os.sep)
+    while relative.startswith(os.pardir + os.sep):
+        relative = relative[len(os.pardir + os.sep):]
+    if extension:
+        relative = os.path.splitext(relative)[0] + "." + extension.lstrip(".")
+    return relative
+
+
+def _contained(output):
+    """output normalized, if it is a relative path inside the output directory."""
+    relative = os.path.normpath(output)
+    if (os.path.isabs(relative) or os.path.splitdrive(relative)[0] or relative == os.pardir
+            or relative.startswith(os.pardir + os.sep)):
+        raise ValueError("output %r is outside of the output directory" % output)
+    return relative
+
+
+def read_manifest(path, outdir=".", filter=None, params=None, extension=None):
+    """Yield the Items of a manifest file.
+
+    filter and params are the defaults of the items, extension that of the
+    outputs derived from the inputs (default: the input's). Outputs must be
+    relative paths inside outdir, and two items may not have the same one.
+    """
+    root = os.path.dirname(os.path.abspath(path))
+    # Line of the item writing each output.
+    seen = {}
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                entry = json.loads(line) if line.startswith("{") else {"input": line}
+                name = entry.get("filter", filter)
+                if name is None:
+                    raise ValueError("no filter given, in the manifest or as the default")
+                values = dict(params or {}) if name == filter else {}
+                values.update(entry.get("params", {}))
+                relative = _contained(entry.get("output") or output_name(entry["input"], extension))
+                if relative in seen:
+                    raise ValueError("output %s is already the one of line %d" % (relative, seen[relative]))
+                seen[relative] = number
+                yield Item(os.path.join(root, entry["input"]), os.path.join(outdir, relative), name,
+                           _params(name, values), relative)
+            except (ValueError, KeyError) as err:
+                raise ValueError("%s:%d: %s" % (path, number, err))
+
+
+class Journal(object):
+    """Items finished by a worker, one JSON line each, appended and synced."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        torn = False
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    torn = not line.endswith("\n")
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line of a worker killed while writing it.
+                        continue
+                    self.done[entry["item"]] = entry["label"]
+        self.file = open(path, "a")
+        if torn:
+            self.file.write("\n")
+
+    def finished(self, item):
+        """Whether item was finished with the same filter and parameters."""
+        return self.done.get(item.name) == item.label and os.path.exists(item.output)
+
+    def record(self, item):
+        self.file.write(json.dumps({"item": item.name, "label": item.label}) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.done[item.name] = item.label
+
+    def close(self):
+        self.file.close()
+
+
+def journal_path(manifest, index, count, directory="."):
+    """Default journal of a shard, in directory."""
+    base = os.path.splitext(os.path.basename(manifest))[0]
+    return os.path.join(directory, "%s.shard%dof%d.journal" % (base, index, count))
+
+
+def _makedirs(directory):
+    try:
+        os.makedirs(directory)
+    except OSError as err:
+        # Other workers create the same directories.
+        if err.errno != errno.EEXIST or not os.path.isdir(directory):
+            raise
+
+
+def save_atomic(path, pixels):
+    """images.save() to a temporary file next to path, synced and renamed to path.
+
+    The temporary file is named after path, so the one a killed worker left
+    behind is overwritten when the item is run again. Only the worker of
+    the shard of path writes it.
+    """
+    directory, name = os.path.split(path)
+    directory = directory or "."
+    _makedirs(directory)
+    base, ext = os.path.splitext(name)
+    tmp = os.path.join(directory, "." + base + ".tmp" + ext)
+    try:
+        images.save(tmp, pixels)
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+        _replace(tmp, path)
+    except BaseException:
+        # images.save() may fail before creating the file, such as for an
+        # unknown extension, keep its error.
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def process(item):
+    """Filter one item into its output, returns (item, error or None)."""
+    try:
+        pixels = images.load(item.input)
+        save_atomic(item.output, kernels.FILTERS[item.filter](pixels, **item.params))
+        return item, None
+    except Exception as err:
+        return item, err
+
+
+class Stats(object):
+    """Counts of the items of a run of one shard."""
+
+    def __init__(self):
+        self.total = self.shard = self.skipped = self.done = self.failed = 0
+
+    def __str__(self):
+        return "%d items in the shard of %d: %d done, %d skipped, %d failed" % (
+            self.shard, self.total, self.done, self.skipped, self.failed)
+
+
+def run(manifest, index, count, outdir=".", journal=None, jobs=1, report=None, **defaults):
+    """Filter the items of shard index of count of manifest, returns the Stats.
+
+    journal is the path of the journal of the shard, see journal_path(),
+    jobs the processes filtering images (default: one per CPU).
+    report(item, error) is called as each item is finished or fails.
+    defaults are the filter, params and extension of read_manifest().
+    """
+    jobs = jobs or parallel.cpu_count()
+    stats = Stats()
+    log = Journal(journal or journal_path(manifest, index, count))
+
+    def todo():
+        for item in read_manifest(manifest, outdir, **defaults):
+            stats.total += 1
+            if shard_of(item.name, count) != index:
+                continue
+            stats.shard += 1
+            if log.finished(item):
+                stats.skipped += 1
+                continue
+            yield item
+
+    pool = parallel.make_pool(jobs, "process") if jobs > 1 else None
+    try:
+        if pool is None:
+            results = (process(item) for item in todo())
+        else:
+            results = parallel.ordered(pool, process, todo(), WINDOW * jobs)
+        for item, err in results:
+            if err is None:
+                log.record(item)
+                stats.done += 1
+            else:
+                stats.failed += 1
+            if report is not None:
+                report(item, err)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        log.close()
+    return stats
@@ -0,0 +1,123 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Buffers between pixel regions and NumPy arrays, without copies.
+
+The bytes a pixel region returns are wrapped as an array with
+np.frombuffer, the kernels write their result into preallocated strip
+buffers, and these buffers are handed straight to the shadow region. Regions
+that only take strings, as in GIMP 2.8, get one serialized copy of a strip
+instead, which is the only copy left on the Python side.
+
+The module counts the buffers it allocates and the bytes it copies, so that
+a run can be checked to be zero-copy:
+
+    bridge.counters.reset()
+    regions.apply(layer, kernels.chicago, {})
+    print(bridge.counters.report(layer.width * layer.height))
+"""
+
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class Counters(object):
+    """Allocations and copies done by the bridge, shared by all threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.allocations = self.bytes_allocated = self.bytes_copied = 0
+
+    def allocated(self, nbytes):
+        with self._lock:
+            self.allocations += 1
+            self.bytes_allocated += nbytes
+
+    def copied(self, nbytes):
+        with self._lock:
+            self.bytes_copied += nbytes
+
+    def per_megapixel(self, pixels):
+        """(allocations, bytes allocated, bytes copied) per megapixel of pixels."""
+        scale = 1e6 / max(1, pixels)
+        return self.allocations * scale, self.bytes_allocated * scale, self.bytes_copied * scale
+
+    def report(self, pixels):
+        allocations, allocated, copied = self.per_megapixel(pixels)
+        return "%.1f allocations, %.2f MB allocated, %.2f MB copied per MP" % (
+            allocations, allocated / float(1 << 20), copied / float(1 << 20))
+
+
+counters = Counters()
+
+
+def view(data, rows, width, channels, dtype="u1"):
+    """Array of the bytes of a pixel region, sharing their memory."""
+    return np.frombuffer(data, dtype=dtype).reshape(rows, width, channels)
+
+
+class Buffers(object):
+    """A ring of count preallocated strip buffers, reused in turn.
+
+    A buffer handed out by take() is only reused count takes later, which
+    must outlast the strips in flight.
+    """
+
+    def __init__(self, count, rows, width, channels, dtype="u1"):
+        self.rows, self.width, self.channels = rows, width, channels
+        self.dtype = np.dtype(dtype)
+        nbytes = rows * width * channels * self.dtype.itemsize
+        self.buffers = []
+        for _ in range(count):
+            self.buffers.append(np.empty(rows * width * channels, dtype=self.dtype))
+            counters.allocated(nbytes)
+        self.next = 0
+
+    def take(self, rows=None):
+        """The next buffer as a rows x width x channels array."""
+        rows = self.rows if rows is None else rows
+        buf = self.buffers[self.next]
+        self.next = (self.next + 1) % len(self.buffers)
+        return buf[:rows * self.width * self.channels].reshape(rows, self.width, self.channels)
+
+
+# Pixel region types known to refuse buffers in assignments.
+_strings_only = set()
+
+
+def assign(rgn, key, block):
+    """rgn[key] = block, without copying block when the region accepts buffers."""
+    kind = type(rgn)
+    if kind not in _strings_only:
+        try:
+            rgn[key] = memoryview(np.ascontiguousarray(block).reshape(-1).view(np.uint8))
+            return
+        except TypeError:
+            _strings_only.add(kind)
+    data = block.tobytes() if hasattr(block, "tobytes") else block.tostring()
+    counters.copied(len(data))
+    rgn[key] = data
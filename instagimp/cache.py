@@ -0,0 +1,82 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Small in-memory caches shared by the filters."""
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """Mapping keeping the maxsize most recently used entries.
+
+    Entries are usually expensive to build but cheap to keep, such as
+    distance maps or lookup tables. When max_bytes is given, the entries
+    are also evicted until the nbytes of the arrays kept add up to at most
+    max_bytes. Access is serialized so the cache can be shared by worker
+    threads.
+    """
+
+    def __init__(self, maxsize=16, max_bytes=None):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Return the value of key and mark it as most recently used."""
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            self._data[key] = value
+            return value
+
+    def put(self, key, value):
+        """Store value under key, evicting the least recently used entries.
+
+        A value larger than max_bytes by itself is not stored.
+        """
+        size = getattr(value, "nbytes", 0)
+        with self._lock:
+            self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = value
+            self.nbytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes is not None and self.nbytes > self.max_bytes):
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key):
+        value = self._data.pop(key, None)
+        self.nbytes -= getattr(value, "nbytes", 0)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
@@ -0,0 +1,388 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Command line interface to the InstaGIMP filters.
+
+Runs the filters on image files without GIMP, for instance
+
+    python -m instagimp apply chicago photos/*.jpg -o out/ -p redshift=40
+
+Parameters default to the values of the plug-in register blocks.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+
+from . import batch, cube, diskcache, frames, images, kernels, parallel, pipeline, preview, service, stream, sweep
+
+
+# Output formats that keep all the frames of animated inputs.
+ANIMATED = (".gif", ".png", ".apng", ".webp", ".tif", ".tiff")
+
+
+def parse_shape(text):
+    """Parse HxWxC into a (height, width, channels) tuple."""
+    return tuple(int(part) for part in text.lower().split("x"))
+
+
+def output_path(path, outdir, extension=None):
+    """Path of the result of path in outdir."""
+    base, ext = os.path.splitext(os.path.basename(path))
+    if extension:
+        ext = "." + extension.lstrip(".")
+    return os.path.join(outdir, base + ext)
+
+
+def run(job):
+    """Filter one file, job is (kernel, params, path, target, options)."""
+    kernel, params, path, target, options = job
+    threads = options.get("threads", 1)
+
+    if options.get("preview"):
+        if options.get("stream"):
+            src = stream.source(path, options.get("shape"))
+        else:
+            src = stream.ArraySource(images.load(path))
+        try:
+            out = preview.Preview(src, options["preview"]).render(kernel, params)
+        finally:
+            src.close()
+        if options.get("stream"):
+            dst = stream.sink(target, out.shape[1], out.shape[0], out.shape[2])
+            dst.write(0, out)
+            dst.close()
+        else:
+            images.save(target, out)
+        return path, target
+
+    if options.get("stream"):
+        src = stream.source(path, options.get("shape"))
+        dst = stream.sink(target, src.width, src.height, src.channels)
+        try:
+            stream.process(src, dst, kernel, params, options["max_bytes"], workers=threads or parallel.cpu_count())
+        finally:
+            src.close()
+            dst.close()
+        return path, target
+
+    if images.frame_count(path) > 1 and target.lower().endswith(ANIMATED):
+        frames.animation(path, target, kernel, params)
+        return path, target
+
+    pixels = images.load(path)
+    if threads == 1:
+        compute = None
+    else:
+        compute = lambda pixels: parallel.map_tiles(pixels, kernel, params, workers=threads)
+    if options.get("cache"):
+        cache = diskcache.open_cache(options["cache"], options["cache_bytes"])
+        out = cache.filter(kernel, params, pixels, compute, options.get("label"))
+    elif compute is None:
+        out = kernel(pixels, **params)
+    else:
+        out = compute(pixels)
+    images.save(target, out)
+    return path, target
+
+
+def _safe_run(job):
+    try:
+        return run(job) + (None,)
+    except Exception as err:
+        return job[2], job[3], err
+
+
+def run_all(args, kernel, params, label=None):
+    """Run kernel over the inputs of args, returns the exit status.
+
+    label identifies kernel and params in the result cache, see
+    diskcache.signature().
+    """
+    if not os.path.isdir(args.outdir):
+        os.makedirs(args.outdir)
+    options = dict(threads=args.threads, stream=args.stream, max_bytes=int(args.max_memory * (1 << 20)),
+                   shape=args.raw_shape, preview=args.preview, cache=args.cache,
+                   cache_bytes=int(args.cache_size * (1 << 20)), label=label)
+    jobs = [(kernel, params, path, output_path(path, args.outdir, args.format), options)
+            for path in args.inputs]
+    if args.stream and not all(stream.can_write(job[3]) for job in jobs):
+        raise ValueError("--stream writes .tif, .ppm, .pam or .raw files, see --format")
+
+    if args.cache and (args.stream or args.preview or args.sequence):
+        raise ValueError("--cache cannot be combined with --stream, --preview or --sequence")
+    if args.sequence:
+        if args.stream or args.preview:
+            raise ValueError("--sequence cannot be combined with --stream or --preview")
+        pairs = [job[2:4] for job in jobs]
+        results = frames.sequence(pairs, kernel, params, workers=args.jobs or parallel.cpu_count())
+        pool = None
+    elif args.jobs == 1 or len(jobs) == 1:
+        results = (_safe_run(job) for job in jobs)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(args.jobs or None)
+        results = pool.imap_unordered(_safe_run, jobs)
+
+    failures = 0
+    try:
+        for path, target, err in results:
+            if err is not None:
+                failures += 1
+                print("%s: %s" % (path, err), file=sys.stderr)
+            elif args.verbose:
+                print("%s -> %s" % (path, target))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if args.cache and args.verbose:
+        print_cache_stats(diskcache.open_cache(args.cache, options["cache_bytes"]))
+    return 1 if failures else 0
+
+
+def print_cache_stats(cache):
+    stats = cache.stats()
+    print("%s: %d hits, %d misses (%.0f%%), %d entries, %.1f of %.1f MB"
+          % (cache.root, stats["hits"], stats["misses"], 100 * stats["hit_rate"], stats["entries"],
+             stats["bytes"] / float(1 << 20), stats["max_bytes"] / float(1 << 20)))
+
+
+def apply(args):
+    kernel, params = kernels.FILTERS[args.filter], kernels.parse_params(args.filter, args.param)
+    label = diskcache.signature(kernel, params)
+    if args.lut:
+        kernel, params = cube.sample(kernel, params, args.lut), {}
+        label += " lut%d" % args.lut
+    return run_all(args, kernel, params, label)
+
+
+def export_cube(args):
+    kernel, params = kernels.FILTERS[args.filter], kernels.parse_params(args.filter, args.param)
+    lut = cube.sample(kernel, params, args.size)
+    lut.write(args.output)
+    base = os.path.splitext(args.output)[0]
+    with open(base + ".json", "w") as f:
+        json.dump(lut.radial(), f, indent=2, sort_keys=True)
+    print("%s: %d^3 LUT, radial offset in %s.json" % (args.output, args.size, base))
+    print("max error: %d levels as LUT + vignette, %d with the parametric offset of the .cube file"
+          % (cube.max_error(lut, kernel, params), cube.max_error(lut.parametric(), kernel, params)))
+    return 0
+
+
+def show_cache(args):
+    cache = diskcache.ResultCache(args.directory, int(args.cache_size * (1 << 20)))
+    if args.clear:
+        cache.clear()
+    else:
+        cache.evict()
+    print_cache_stats(cache)
+    return 0
+
+
+def render_sweep(args):
+    if not (args.output or args.outdir):
+        raise ValueError("give a contact sheet with -o or an output directory with --outdir")
+    variants = [variant for text in args.look for variant in sweep.parse(text)]
+    pixels = images.load(args.input)
+    if args.size:
+        proxies = preview.Preview(stream.ArraySource(pixels), args.size)
+        pixels, distance = proxies.proxy(next(proxies.sizes()))
+    else:
+        distance = None
+    labels = [sweep.label(name, params) for name, params in variants]
+    if args.outdir and not os.path.isdir(args.outdir):
+        os.makedirs(args.outdir)
+    base, ext = os.path.splitext(os.path.basename(args.input))
+
+    # Only the contact sheet needs every variant at once.
+    tiles = []
+    for text, tile in zip(labels, sweep.Sweep(pixels, distance)(variants)):
+        if args.outdir:
+            name = "%s-%s%s" % (base, "-".join(text.replace(",", "_").split()), ext)
+            images.save(os.path.join(args.outdir, name), tile)
+            if args.verbose:
+                print(name)
+        if args.output:
+            tiles.append(tile)
+    if args.output:
+        images.save(args.output, sweep.contact_sheet(tiles, labels, args.columns))
+    print("%d variants of %dx%d pixels" % (len(labels), pixels.shape[1], pixels.shape[0]))
+    return 0
+
+
+def run_batch(args):
+    index, count = batch.parse_shard(args.shard)
+    params = kernels.parse_params(args.filter, args.param) if args.filter else {}
+    if args.param and not args.filter:
+        raise ValueError("--param needs a default --filter")
+
+    def report(item, err):
+        if err is not None:
+            print("%s: %s" % (item.input, err), file=sys.stderr)
+        elif args.verbose:
+            print("%s -> %s" % (item.input, item.output))
+
+    stats = batch.run(args.manifest, index, count, args.outdir, args.journal, args.jobs, report,
+                      filter=args.filter, params=params, extension=args.format)
+    print("shard %d/%d: %s" % (index, count, stats))
+    return 1 if stats.failed else 0
+
+
+def run_service(args):
+    service.serve(args.host, args.port, workers=args.jobs or None, kind=args.pool,
+                  max_concurrency=args.max_concurrency or None, max_queue=args.max_queue,
+                  max_body=int(args.max_body * (1 << 20)), verbose=args.verbose)
+    return 0
+
+
+def apply_pipeline(args):
+    return run_all(args, pipeline.parse(args.pipeline), {})
+
+
+def list_filters(args):
+    for name, kernel in kernels.FILTERS.items():
+        params = kernels.parameters(kernel)
+        print("%s: %s" % (name, ", ".join("%s=%s" % item for item in params.items())))
+    return 0
+
+
+def add_output_arguments(sub):
+    sub.add_argument("-o", "--outdir", default=".", help="output directory (default: current directory)")
+    sub.add_argument("-j", "--jobs", type=int, default=0,
+                     help="number of worker processes (default: one per CPU)")
+    sub.add_argument("-t", "--threads", type=int, default=1,
+                     help="filter each image in tiles on this many threads, 0 for one per CPU (default: 1)")
+    sub.add_argument("-f", "--format", help="output file extension (default: same as the input)")
+    sub.add_argument("--stream", action="store_true",
+                     help="filter strip by strip into memory-mapped .tif, .ppm, .pam or .raw outputs")
+    sub.add_argument("--max-memory", type=float, default=stream.MAX_BYTES >> 20, metavar="MB",
+                     help="memory budget of the strips with --stream (default: %(default)s)")
+    sub.add_argument("--preview", type=int, metavar="SIZE",
+                     help="only render a preview whose longest side is SIZE pixels")
+    sub.add_argument("--sequence", action="store_true",
+                     help="process the inputs as the frames of one sequence, decoding, filtering and encoding "
+                          "them in a pipeline with a shared distance map")
+    sub.add_argument("--raw-shape", type=parse_shape, metavar="HxWxC", help="shape of .raw inputs")
+    sub.add_argument("--cache", metavar="DIR",
+                     help="reuse the results of earlier runs on the same pixels and parameters stored in DIR")
+    sub.add_argument("--cache-size", type=float, default=diskcache.MAX_BYTES >> 20, metavar="MB",
+                     help="size cap of the --cache directory, least recently used results go first "
+                          "(default: %(default)s)")
+    sub.add_argument("-v", "--verbose", action="store_true")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="instagimp", description="Apply InstaGIMP filters to image files.")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    sub = commands.add_parser("apply", help="filter image files into an output directory")
+    sub.add_argument("filter", choices=list(kernels.FILTERS))
+    sub.add_argument("inputs", nargs="+", metavar="INPUT")
+    sub.add_argument("-p", "--param", action="append", default=[], metavar="NAME=VALUE",
+                     help="override a filter parameter, colors are given as R,G,B")
+    sub.add_argument("--lut", type=int, choices=cube.SIZES,
+                     help="run the filter as a color LUT of this size plus the vignette")
+    add_output_arguments(sub)
+    sub.set_defaults(func=apply)
+
+    sub = commands.add_parser("cube", help="export the colors of a filter as a .cube 3D LUT")
+    sub.add_argument("filter", choices=list(kernels.FILTERS))
+    sub.add_argument("-o", "--output", required=True, help=".cube file, the radial offset goes to a .json next to it")
+    sub.add_argument("-s", "--size", type=int, default=33, choices=cube.SIZES,
+                     help="lattice points per axis (default: %(default)s)")
+    sub.add_argument("-p", "--param", action="append", default=[], metavar="NAME=VALUE",
+                     help="override a filter parameter, colors are given as R,G,B")
+    sub.set_defaults(func=export_cube)
+
+    sub = commands.add_parser("pipeline", help="apply a chain of filters in a single pass")
+    sub.add_argument("pipeline", help='looks separated by semicolons, e.g. "geneva; andromeda whitecenter=20"')
+    sub.add_argument("inputs", nargs="+", metavar="INPUT")
+    add_output_arguments(sub)
+    sub.set_defaults(func=apply_pipeline)
+
+    sub = commands.add_parser("sweep", help="render one image with a grid of filters and parameter values")
+    sub.add_argument("input")
+    sub.add_argument("-l", "--look", action="append", required=True, metavar="SWEEP",
+                     help='filter and values to sweep separated by slashes, e.g. '
+                          '"chicago sepiacolor=214,240,201/200,220,180 redshift=20/40", can be repeated')
+    sub.add_argument("-o", "--output", help="contact sheet of the variants")
+    sub.add_argument("--outdir", help="write each variant to a file in this directory")
+    sub.add_argument("-s", "--size", type=int, default=preview.SIZE,
+                     help="longest side of the variants, 0 for full resolution (default: %(default)s)")
+    sub.add_argument("-c", "--columns", type=int, help="columns of the contact sheet (default: about square)")
+    sub.add_argument("-v", "--verbose", action="store_true")
+    sub.set_defaults(func=render_sweep)
+
+    sub = commands.add_parser("batch", help="filter the items of one shard of a manifest, resuming from a journal")
+    sub.add_argument("manifest", help="input paths or JSON items, one per line, see instagimp/batch.py")
+    sub.add_argument("--shard", default="0/1", metavar="INDEX/COUNT",
+                     help="shard of this worker among COUNT workers, from 0 (default: %(default)s)")
+    sub.add_argument("-f", "--filter", choices=list(kernels.FILTERS), help="filter of the items that give none")
+    sub.add_argument("-p", "--param", action="append", default=[], metavar="NAME=VALUE",
+                     help="override a parameter of the default filter, colors are given as R,G,B")
+    sub.add_argument("-o", "--outdir", default=".", help="output directory (default: current directory)")
+    sub.add_argument("--format", help="output file extension of path items (default: same as the input)")
+    sub.add_argument("--journal", help="journal of the finished items (default: MANIFEST.shardIofN.journal "
+                                       "in the current directory)")
+    sub.add_argument("-j", "--jobs", type=int, default=0,
+                     help="number of worker processes (default: one per CPU)")
+    sub.add_argument("-v", "--verbose", action="store_true")
+    sub.set_defaults(func=run_batch)
+
+    sub = commands.add_parser("serve", help="serve the filters over HTTP on a warm pool of workers")
+    sub.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    sub.add_argument("--port", type=int, default=8080, help="(default: %(default)s)")
+    sub.add_argument("-j", "--jobs", type=int, default=0, help="number of workers (default: one per CPU)")
+    sub.add_argument("--pool", choices=("process", "thread"), default="process",
+                     help="kind of workers (default: %(default)s)")
+    sub.add_argument("--max-concurrency", type=int, default=0, metavar="N",
+                     help="images filtered at once (default: the number of workers)")
+    sub.add_argument("--max-queue", type=int, default=service.MAX_QUEUE, metavar="N",
+                     help="requests waiting for a worker before new ones get 503 (default: %(default)s)")
+    sub.add_argument("--max-body", type=float, default=service.MAX_BODY >> 20, metavar="MB",
+                     help="largest image accepted (default: %(default)s)")
+    sub.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    sub.set_defaults(func=run_service)
+
+    sub = commands.add_parser("cache", help="show the hit and miss counters and the size of a result cache")
+    sub.add_argument("directory")
+    sub.add_argument("--cache-size", type=float, default=diskcache.MAX_BYTES >> 20, metavar="MB",
+                     help="evict the least recently used results beyond this size (default: %(default)s)")
+    sub.add_argument("--clear", action="store_true", help="remove the results and reset the counters")
+    sub.set_defaults(func=show_cache)
+
+    sub = commands.add_parser("list", help="list the filters and their default parameters")
+    sub.set_defaults(func=list_filters)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except (ValueError, RuntimeError, EnvironmentError) as err:
+        parser.error(str(err))
@@ -0,0 +1,212 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""3D color LUTs of the filters, written as .cube files.
+
+Without its radial terms a filter maps each (r, g, b) to a color, which is
+sampled on an N x N x N lattice (17, 33 or 65 points per axis) and applied
+by trilinear interpolation. The radial part is kept separately as an offset
+
+    slope[c] * d + curve[c] * d * d
+
+added to channel c before clamping, d being the normalized distance of
+instagimp.vignette. The slope is a constant for every filter but the blue
+channel of Andromeda, whose blue curve on the vignetted average makes it
+depend on the channel sum. A Lut3D keeps that dependency, the parametric
+offset exported next to a .cube file uses the slope of mid gray instead.
+
+The lattice keeps values outside of 0..1 unclamped so that the offset can
+bring them back, which .cube readers such as ffmpeg's lut3d accept. A Lut3D
+is called like a kernel and can replace the filter anywhere, max_error()
+measures how far it is from the reference.
+"""
+
+from . import luts, vignette
+
+np = luts.np
+
+# Lattice sizes of the usual .cube files.
+SIZES = (17, 33, 65)
+
+# Channel sum of mid gray, where s dependent slopes are taken.
+MID_GRAY = 3 * 128
+
+
+class Lut3D(object):
+    """A color lattice with the radial offsets of a filter.
+
+    table is an N x N x N x 3 array indexed [r, g, b] giving the output in
+    0..255 units, slope and curve the per channel coefficients of the radial
+    offset, in 0..255 units as well. A slope can also be a 766 entry table
+    indexed by the channel sum, as in luts.Tables.
+    """
+
+    def __init__(self, table, slope=(0, 0, 0), curve=(0, 0, 0), title=None):
+        self.table = np.ascontiguousarray(table, dtype=np.float32)
+        self.size = self.table.shape[0]
+        self.slope = tuple(np.asarray(x, dtype=np.float64) if np.ndim(x) else float(x) for x in slope)
+        self.curve = tuple(float(x) for x in curve)
+        self.title = title
+
+        # Lattice cell and weight of each 8-bit input value.
+        pos = np.arange(256) * ((self.size - 1) / 255.0)
+        self._cell = np.minimum(pos.astype(np.intp), self.size - 2)
+        self._weight = (pos - self._cell).astype(np.float32)
+
+    def __repr__(self):
+        return "Lut3D(%r, size=%d)" % (self.title, self.size)
+
+    def color(self, pixels):
+        """Trilinear interpolation of the lattice at HxWxC uint8 or float pixels.
+
+        Returns an HxWx3 float32 array in 0..255 units.
+        """
+        n, flat = self.size, self.table.reshape(-1, 3)
+        if luts.is_float(pixels):
+            pos = [np.clip(pixels[..., c], 0, 1) * np.float32(n - 1) for c in range(3)]
+            index = [np.minimum(p.astype(np.intp), n - 2) for p in pos]
+            weight = [(p - i)[..., np.newaxis] for p, i in zip(pos, index)]
+        else:
+            index = [self._cell[pixels[..., c]] for c in range(3)]
+            weight = [self._weight[pixels[..., c]][..., np.newaxis] for c in range(3)]
+        base = (index[0] * n + index[1]) * n + index[2]
+
+        out = np.zeros(pixels.shape[:2] + (3,), dtype=np.float32)
+        for dr in (0, 1):
+            wr = weight[0] if dr else 1 - weight[0]
+            for dg in (0, 1):
+                wg = wr * (weight[1] if dg else 1 - weight[1])
+                for db in (0, 1):
+                    w = wg * (weight[2] if db else 1 - weight[2])
+                    out += w * flat[base + ((dr * n + dg) * n + db)]
+        return out
+
+    def __call__(self, pixels, distance=None, out=None):
+        if distance is None:
+            distance = vignette.window(pixels.shape[1], pixels.shape[0])
+        return luts.pack_tiles(pixels, distance, self.channels, out)
+
+    def channels(self, pixels, distance):
+        """Unclamped output channels of pixels at distance, like luts.lookup()."""
+        color = self.color(pixels)
+        s = None
+        channels = []
+        for c in range(3):
+            slope = self.slope[c]
+            if np.ndim(slope):
+                if s is None and luts.is_float(pixels):
+                    s = np.clip(np.rint(pixels[..., :3].sum(axis=-1) * luts.SCALE), 0, 765).astype(np.intp)
+                elif s is None:
+                    s = pixels[..., :3].sum(axis=-1, dtype=np.uint16)
+                slope = slope[s]
+            channels.append(color[..., c] + (slope * distance + self.curve[c] * distance * distance))
+        return channels
+
+    def parametric(self):
+        """The same lattice with constant slopes, as exported to .cube files."""
+        slope = [x[MID_GRAY] if np.ndim(x) else x for x in self.slope]
+        return Lut3D(self.table, slope, self.curve, self.title)
+
+    def radial(self):
+        """The parametric radial offset as a dict, in 0..1 units like the .cube file."""
+        slope = self.parametric().slope
+        return {"distance": "sqrt((x - width / 2)^2 + (y - height / 2)^2) / sqrt(width^2 + height^2)",
+                "offset": "slope * distance + curve * distance^2, added before clamping",
+                "slope": [x / 255.0 for x in slope],
+                "curve": [x / 255.0 for x in self.curve]}
+
+    def write(self, path):
+        """Write the lattice as a .cube file, the radial offset in comments."""
+        radial = self.radial()
+        with open(path, "w") as f:
+            if self.title:
+                f.write('TITLE "%s"\n' % self.title)
+            f.write("# Radial offset: %s\n" % radial["offset"])
+            f.write("# distance = %s\n" % radial["distance"])
+            f.write("# slope %.6f %.6f %.6f\n" % tuple(radial["slope"]))
+            f.write("# curve %.6f %.6f %.6f\n" % tuple(radial["curve"]))
+            f.write("LUT_3D_SIZE %d\n" % self.size)
+            f.write("DOMAIN_MIN 0.0 0.0 0.0\nDOMAIN_MAX 1.0 1.0 1.0\n")
+            # Red varies fastest.
+            for r, g, b in self.table.transpose(2, 1, 0, 3).reshape(-1, 3) / 255.0:
+                f.write("%.6f %.6f %.6f\n" % (r, g, b))
+
+
+def read(path):
+    """Read a .cube file written by Lut3D.write(), or any 3D .cube file."""
+    title, size, slope, curve, rows = None, None, (0, 0, 0), (0, 0, 0), []
+    with open(path) as f:
+        for line in f:
+            words = line.split()
+            if not words:
+                continue
+            if words[0] == "#" and len(words) == 5 and words[1] in ("slope", "curve"):
+                coefficients = tuple(255.0 * float(x) for x in words[2:])
+                if words[1] == "slope":
+                    slope = coefficients
+                else:
+                    curve = coefficients
+            elif words[0].startswith("#"):
+                continue
+            elif words[0] == "TITLE":
+                title = line.split(None, 1)[1].strip().strip('"')
+            elif words[0] == "LUT_3D_SIZE":
+                size = int(words[1])
+            elif words[0][0] in "0123456789-+.":
+                rows.append([255.0 * float(x) for x in words[:3]])
+    if size is None or len(rows) != size ** 3:
+        raise ValueError("%s: not a 3D .cube file" % path)
+    table = np.array(rows).reshape(size, size, size, 3).transpose(2, 1, 0, 3)
+    return Lut3D(table, slope, curve, title)
+
+
+def sample(kernel, params=None, size=33):
+    """Sample the color part of a kernel from instagimp.kernels into a Lut3D."""
+    if np is None:
+        raise RuntimeError("3D LUTs need NumPy")
+    tables = kernel.tables(**(params or {}))
+    grid = np.linspace(0.0, 255.0, size)
+    channels = np.meshgrid(grid, grid, grid, indexing="ij")
+    color = luts.evaluate(tables, channels, 0.0)
+    table = np.stack([np.broadcast_to(c, channels[0].shape) for c in color], axis=-1)
+
+    return Lut3D(table, tables.slope, tables.curve, getattr(kernel, "__name__", None))
+
+
+def test_pixels(step=2):
+    """Every color whose channels are multiples of step, as one image.
+
+    step is a power of two, the image is 4096 x 4096 for step 1.
+    """
+    levels = np.arange(0, 256, step, dtype=np.uint8)
+    r, g, b = np.meshgrid(levels, levels, levels, indexing="ij")
+    colors = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=-1)
+    return colors.reshape(-1, 16 * len(levels), 3)
+
+
+def max_error(lut, kernel, params=None, pixels=None):
+    """Largest difference in 8-bit levels between lut and kernel.
+
+    Both are run on pixels (by default test_pixels()) with the distance map
+    of their frame, so the colors are spread over the whole vignette.
+    """
+    if pixels is None:
+        pixels = test_pixels()
+    reference = kernel(pixels, **(params or {}))
+    return int(np.abs(lut(pixels).astype(np.int16) - reference.astype(np.int16)).max())
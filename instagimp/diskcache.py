@@ -0,0 +1,254 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""On-disk cache of filtered images, addressed by content.
+
+Re-exports, retries and A/B comparisons filter the same pixels with the same
+look again. The result of a run is stored under a hash of the input pixels,
+the filter and its full parameter tuple, so a later run with the same key
+loads it instead of filtering. The cache is a directory of .npy files with a
+size cap: the least recently used entries are evicted first, using the
+modification time that every hit refreshes.
+
+Hits and misses are counted in the directory as well, each one a decimal
+number in a small file that every lookup locks, reads and rewrites, so that
+the worker processes of a batch share the counters and they survive the run
+to size the cache. Without fcntl, on Windows, concurrent lookups may lose
+counts.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from . import kernels
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Default size cap of a cache directory.
+MAX_BYTES = 1 << 30
+
+# Part of every key, to bump when a change of the filters changes their output.
+VERSION = 2
+
+SUFFIX = ".npy"
+
+_replace = getattr(os, "replace", os.rename)
+
+
+def signature(kernel, params=None):
+    """Text identifying a kernel and its full parameters.
+
+    The parameters of the filters in instagimp.kernels are completed with
+    their register defaults and their values written as floats, tuples of
+    floats for colors, so that an override equal to the default maps to the
+    same entry.
+    """
+    params = dict(params or {})
+    if hasattr(kernel, "spec"):
+        full = kernels.parameters(kernel)
+        full.update(params)
+        params = full
+    name = getattr(kernel, "__name__", None) or repr(kernel)
+    return "%s %r" % (name, tuple(sorted((key, _normalize(value)) for key, value in params.items())))
+
+
+def _normalize(value):
+    """A parameter value as a float, or a tuple of floats for sequences."""
+    if isinstance(value, (tuple, list)):
+        return tuple(float(x) for x in value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def key(pixels, label):
+    """Hex digest of the pixels of an array and the signature of a kernel."""
+    digest = hashlib.sha1()
+    header = "%d %s %s %r\n" % (VERSION, label, pixels.dtype.str, pixels.shape)
+    digest.update(header.encode("utf-8"))
+    digest.update(np.ascontiguousarray(pixels).data)
+    return digest.hexdigest()
+
+
+def _read_count(fd):
+    """The count of a counter file open as fd, at its start."""
+    data = os.read(fd, 32)
+    if data.startswith(b"."):
+        # Counters of earlier versions, one byte per lookup.
+        return os.fstat(fd).st_size
+    try:
+        return int(data)
+    except ValueError:
+        return 0
+
+
+class ResultCache(object):
+    """Filtered images stored in a directory, at most max_bytes of them."""
+
+    def __init__(self, root, max_bytes=MAX_BYTES):
+        if np is None:
+            raise RuntimeError("the result cache needs NumPy")
+        self.root = root
+        self.max_bytes = max_bytes
+        if not os.path.isdir(root):
+            os.makedirs(root)
+
+    def __repr__(self):
+        return "ResultCache(%r, max_bytes=%d)" % (self.root, self.max_bytes)
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def _count(self, name):
+        """Add one to the counter name."""
+        fd = os.open(self._path(name), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                # Released when fd is closed.
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            data = ("%d\n" % (_read_count(fd) + 1)).encode("ascii")
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.write(fd, data)
+            os.ftruncate(fd, len(data))
+        finally:
+            os.close(fd)
+
+    def _total(self, name):
+        try:
+            fd = os.open(self._path(name), os.O_RDONLY)
+        except OSError:
+            return 0
+        try:
+            return _read_count(fd)
+        finally:
+            os.close(fd)
+
+    @property
+    def hits(self):
+        return self._total("hits")
+
+    @property
+    def misses(self):
+        return self._total("misses")
+
+    def entries(self):
+        """(mtime, size, path) of the entries, least recently used first."""
+        result = []
+        for name in os.listdir(self.root):
+            if name.endswith(SUFFIX):
+                path = self._path(name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                result.append((st.st_mtime, st.st_size, path))
+        result.sort()
+        return result
+
+    def stats(self):
+        """Counters and size of the cache as a dict."""
+        entries = self.entries()
+        hits, misses = self.hits, self.misses
+        return {"hits": hits, "misses": misses, "hit_rate": float(hits) / max(1, hits + misses),
+                "entries": len(entries), "bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes}
+
+    def get(self, key):
+        """The array stored under key, or None, counting a hit or a miss."""
+        path = self._path(key + SUFFIX)
+        try:
+            out = np.load(path)
+            os.utime(path, None)
+        except (EnvironmentError, ValueError):
+            # Missing, evicted by another process meanwhile or truncated.
+            self._count("misses")
+            return None
+        self._count("hits")
+        return out
+
+    def put(self, key, pixels):
+        """Store pixels under key, then evict entries beyond max_bytes."""
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.root)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.ascontiguousarray(pixels))
+            _replace(tmp, self._path(key + SUFFIX))
+        except Exception:
+            os.remove(tmp)
+            raise
+        self.evict()
+
+    def evict(self, max_bytes=None):
+        """Remove the least recently used entries until at most max_bytes are left."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        self.evict(0)
+        for name in ("hits", "misses"):
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                pass
+
+    def filter(self, kernel, params, pixels, compute=None, label=None):
+        """Result of kernel on pixels, from the cache when it was stored before.
+
+        compute(pixels) computes a missing result, kernel(pixels, **params) by
+        default. label identifies kernel and params, signature(kernel, params)
+        by default.
+        """
+        name = key(pixels, label or signature(kernel, params))
+        out = self.get(name)
+        if out is None:
+            out = compute(pixels) if compute is not None else kernel(pixels, **params)
+            self.put(name, out)
+        return out
+
+
+_open = {}
+
+
+def open_cache(root, max_bytes=MAX_BYTES):
+    """ResultCache of root, shared by the calls of a process."""
+    cache = _open.get(root)
+    if cache is None or cache.max_bytes != max_bytes:
+        cache = _open[root] = ResultCache(root, max_bytes)
+    return cache
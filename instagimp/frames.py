@@ -0,0 +1,110 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""Filtering of animations and image sequences.
+
+The frames of an animation or of a numbered sequence share their geometry,
+so the distance map is computed once per frame size and the compiled tables
+once for the whole run instead of once per frame. Sequences of files are
+processed as a pipeline: frames are decoded on a thread pool ahead of the
+filtering, which runs on the calling thread, and encoded behind it, with at
+most depth frames in flight on either side.
+"""
+
+from collections import deque
+
+from . import images, parallel, vignette
+
+# Frames decoded ahead of and encoded behind the one being filtered.
+DEPTH = 4
+
+
+class Frames(object):
+    """Applies a kernel to frames, reusing the distance map of their size."""
+
+    def __init__(self, kernel, params):
+        self.kernel, self.params = kernel, params
+        self.size, self.distance = None, None
+
+    def __call__(self, pixels):
+        size = pixels.shape[1], pixels.shape[0]
+        if size != self.size:
+            self.size, self.distance = size, vignette.window(*size)
+        return self.kernel(pixels, distance=self.distance, **self.params)
+
+
+def animation(path, target, kernel, params):
+    """Filter every frame of an animated GIF, PNG or TIFF into target."""
+    frames, options = images.load_frames(path)
+    apply = Frames(kernel, params)
+    images.save_frames(target, [apply(pixels) for pixels in frames], **options)
+
+
+def _load(path):
+    try:
+        return images.load(path), None
+    except Exception as err:
+        return None, err
+
+
+def _save(job):
+    target, pixels = job
+    images.save(target, pixels)
+
+
+def sequence(pairs, kernel, params, workers=2, depth=DEPTH):
+    """Filter (path, target) pairs as the frames of one sequence.
+
+    Yields (path, target, error) in order as the frames are written, error
+    being None on success. workers threads share the decoding and encoding.
+    """
+    apply = Frames(kernel, params)
+    pool = parallel.make_pool(max(1, workers))
+    pending = deque()
+
+    def finish(item):
+        path, target, result = item
+        if isinstance(result, Exception):
+            return path, target, result
+        try:
+            result.get()
+        except Exception as err:
+            return path, target, err
+        return path, target, None
+
+    try:
+        decoded = parallel.ordered(pool, _load, (path for path, _ in pairs), depth)
+        for i, (pixels, err) in enumerate(decoded):
+            path, target = pairs[i]
+            if err is None:
+                try:
+                    out = apply(pixels)
+                except Exception as error:
+                    pending.append((path, target, error))
+                else:
+                    pending.append((path, target, pool.apply_async(_save, ((target, out),))))
+            else:
+                pending.append((path, target, err))
+            while len(pending) > depth:
+                yield finish(pending.popleft())
+        while pending:
+            yield finish(pending.popleft())
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,130 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Image file I/O for running the filters outside of GIMP.
+
+Files are decoded with Pillow into HxWx3 or HxWx4 uint8 arrays, which is the
+layout the kernels expect.
+"""
+
+import io
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from PIL import Image, ImageSequence
+except ImportError:
+    Image = None
+
+# Extensions used as format names, for encode().
+ALIASES = {"JPG": "JPEG", "TIF": "TIFF"}
+
+
+def _require():
+    if np is None or Image is None:
+        raise RuntimeError("running the filters outside of GIMP requires NumPy and Pillow")
+
+
+def _mode(image):
+    return "RGBA" if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info else "RGB"
+
+
+def load(path):
+    """Decode an image file into an RGB or RGBA uint8 array."""
+    _require()
+    image = Image.open(path)
+    return np.asarray(image.convert(_mode(image)))
+
+
+def frame_count(path):
+    """Number of frames of an image file, 1 for still images."""
+    _require()
+    return getattr(Image.open(path), "n_frames", 1)
+
+
+def load_frames(path):
+    """Decode every frame of an animated GIF, PNG or TIFF.
+
+    Returns the list of frames as uint8 arrays and a dict of the timing
+    options (duration, loop) to save them back with save_frames().
+    """
+    _require()
+    image = Image.open(path)
+    mode = _mode(image)
+    frames, durations = [], []
+    for frame in ImageSequence.Iterator(image):
+        frames.append(np.asarray(frame.convert(mode)))
+        durations.append(frame.info.get("duration", 100))
+    return frames, {"duration": durations, "loop": image.info.get("loop", 0)}
+
+
+def save_frames(path, frames, **options):
+    """Encode uint8 arrays as the frames of an animated image."""
+    _require()
+    images = [Image.fromarray(np.ascontiguousarray(pixels), "RGBA" if pixels.shape[2] == 4 else "RGB")
+              for pixels in frames]
+    images[0].save(path, save_all=True, append_images=images[1:], **options)
+
+
+def save(path, pixels, **options):
+    """Encode an RGB or RGBA uint8 array, the format follows the extension."""
+    _require()
+    image = Image.fromarray(np.ascontiguousarray(pixels), "RGBA" if pixels.shape[2] == 4 else "RGB")
+    if image.mode == "RGBA" and path.lower().endswith((".jpg", ".jpeg")):
+        image = image.convert("RGB")
+    image.save(path, **options)
+
+
+def decode(data):
+    """Decode the bytes of an image file, returns the array and the format name."""
+    _require()
+    image = Image.open(io.BytesIO(data))
+    return np.asarray(image.convert(_mode(image))), image.format
+
+
+def format_name(format):
+    """Pillow name of an image format or extension that it can save."""
+    _require()
+    # Image.SAVE and Image.MIME are empty until the plugins are loaded,
+    # which a fresh worker process has not done yet.
+    Image.init()
+    name = ALIASES.get(format.upper(), format.upper())
+    if name not in Image.SAVE:
+        raise ValueError("unknown image format %r" % format)
+    return name
+
+
+def encode(pixels, format="PNG", **options):
+    """Encode an RGB or RGBA uint8 array into the bytes of an image file."""
+    format = format_name(format)
+    image = Image.fromarray(np.ascontiguousarray(pixels), "RGBA" if pixels.shape[2] == 4 else "RGB")
+    if image.mode == "RGBA" and format == "JPEG":
+        image = image.convert("RGB")
+    buf = io.BytesIO()
+    image.save(buf, format=format, **options)
+    return buf.getvalue()
+
+
+def mime_type(format):
+    """Content type of an image format name."""
+    return Image.MIME.get(format_name(format), "application/octet-stream")
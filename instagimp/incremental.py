@@ -0,0 +1,195 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Re-rendering of one image as the parameters of its filter change.
+
+The output channels of a filter are computed in two stages, see
+instagimp.luts.Tables: a color stage
+
+    value[c][p_c] + total[c][s]
+
+which only depends on the pixels, and the radial terms slope[c] * d and
+curve[c] * d * d added on top. A Render keeps the distance map, the channel
+sums, the color stage of every channel and the radial terms between
+renderings, each keyed by the tables or numbers it was computed from.
+Moving a vignette slider, such as blackoutside on sunnyday, leaves the value
+and total tables unchanged, so the new rendering computes one radial term
+and adds it to the cached colors; changing alpha recomputes the color stage
+and keeps the rest. The terms are computed and added in the same order as
+luts.lookup(), the results are identical to the kernel's.
+
+    render = incremental.Render(pixels, kernels.sunnyday)
+    first = render(blackoutside=80)
+    second = render(blackoutside=120)   # radial terms only
+"""
+
+from . import luts, vignette
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _same(a, b):
+    """Whether two table entries, arrays, numbers or None, are equal."""
+    if a is b:
+        return True
+    if luts._is_array(a) and luts._is_array(b):
+        return a.shape == b.shape and np.array_equal(a, b)
+    if luts._is_array(a) or luts._is_array(b):
+        return False
+    return a == b
+
+
+class Render(object):
+    """One HxWxC uint8 or float image filtered by one kernel, many times.
+
+    distance defaults to the distance map of pixels as a whole frame, pass
+    the one of a preview proxy to render a downscaled image. Kernels without
+    tables, such as pipelines, are run in full every time. stats counts the
+    renderings and the stages recomputed.
+    """
+
+    def __init__(self, pixels, kernel, distance=None):
+        self.pixels = pixels
+        self.kernel = kernel
+        if distance is None:
+            distance = vignette.window(pixels.shape[1], pixels.shape[0])
+        self.distance = distance
+        self.float = luts.is_float(pixels)
+        self.sums = None
+        # Per channel: (value table, total table, color) and (slope table, slope field * d).
+        self.colors = [None] * 3
+        self.slopes = [None] * 3
+        # Radial terms of constant slopes and curves, by ("slope" or "curve", value).
+        self.terms = {}
+        self.stats = {"renders": 0, "color": 0, "slope": 0, "radial": 0}
+        self.scratch = None
+
+        # Transparent tiles are left as they are, like the kernels do.
+        self.keep = None
+        if pixels.shape[2] > 3 and pixels.shape[0] * pixels.shape[1] > luts.TILE * luts.TILE:
+            transparent = luts.scan(pixels)[0]
+            if transparent.any():
+                keep = np.repeat(np.repeat(transparent, luts.TILE, axis=0), luts.TILE, axis=1)
+                self.keep = keep[:pixels.shape[0], :pixels.shape[1]]
+
+    def _channel_sum(self):
+        if self.sums is None:
+            if self.float:
+                self.sums = sum(self.pixels[..., c] * luts.SCALE for c in range(3))
+            else:
+                self.sums = luts.channel_sum(self.pixels)
+        return self.sums
+
+    def _color(self, tables, c):
+        """value[c][p_c] + total[c][s], or None when the channel has neither."""
+        value, total = tables.value[c], tables.total[c]
+        cached = self.colors[c]
+        if cached is not None and _same(cached[0], value) and _same(cached[1], total):
+            return cached[2]
+        self.stats["color"] += 1
+        functions = tables.functions
+        color = None
+        if value is not None:
+            if self.float:
+                color = functions[0][c](self.pixels[..., c] * luts.SCALE)
+            else:
+                color = value[self.pixels[..., c]]
+        if total is not None:
+            s = self._channel_sum()
+            term = functions[1][c](s) if self.float else total[s]
+            color = (0.0 if color is None else color) + term
+        self.colors[c] = (value, total, color)
+        return color
+
+    def _slope(self, tables, c, terms):
+        """slope[c] * d, None when the slope is 0."""
+        slope = tables.slope[c]
+        if not luts._is_array(slope):
+            return self._term(terms, "slope", slope, lambda: slope * self.distance) if slope else None
+        cached = self.slopes[c]
+        if cached is not None and _same(cached[0], slope):
+            return cached[1]
+        self.stats["slope"] += 1
+        s = self._channel_sum()
+        field = tables.functions[2][c](s) if self.float else slope[s]
+        self.slopes[c] = (slope, field * self.distance)
+        return self.slopes[c][1]
+
+    def _term(self, terms, kind, value, compute):
+        key = (kind, value)
+        if key not in terms:
+            if key in self.terms:
+                terms[key] = self.terms[key]
+            else:
+                self.stats["radial"] += 1
+                terms[key] = compute()
+        return terms[key]
+
+    def __call__(self, out=None, **params):
+        """pixels filtered with params, written to out when given."""
+        self.stats["renders"] += 1
+        if not hasattr(self.kernel, "tables"):
+            return self.kernel(self.pixels, distance=self.distance, out=out, **params)
+        tables = self.kernel.tables(**params)
+        terms = {}
+        out = luts._output(self.pixels, out)
+        for c in range(3):
+            # value + total + slope * d + curve * d * d, as luts._combine() adds them.
+            color = self._color(tables, c)
+            operands = [0.0 if color is None else color]
+            slope, curve = self._slope(tables, c, terms), tables.curve[c]
+            if slope is not None:
+                operands.append(slope)
+            if curve:
+                operands.append(self._term(terms, "curve", curve, lambda: curve * self.distance * self.distance))
+            self._pack(operands, out[..., c])
+        # Only the terms of this rendering are kept for the next one.
+        self.terms = terms
+        if self.keep is not None:
+            out[self.keep] = self.pixels[self.keep]
+        return out
+
+    def _pack(self, operands, out):
+        """Sum operands in order, clamp and store them to out like luts.pack().
+
+        The sum is accumulated in a scratch buffer kept between renderings.
+        """
+        arrays = [x for x in operands if luts._is_array(x)]
+        if not arrays:
+            value = luts.checkColor(sum(operands))
+            out[...] = value / luts.SCALE if self.float else value
+            return
+        shape, dtype = np.broadcast(*arrays).shape, np.result_type(*operands)
+        if self.scratch is None or self.scratch.shape != shape or self.scratch.dtype != dtype:
+            self.scratch = np.empty(shape, dtype)
+        acc = self.scratch
+        if len(operands) == 1:
+            np.clip(operands[0], 0, 255, out=acc)
+        else:
+            np.add(operands[0], operands[1], out=acc)
+            for operand in operands[2:]:
+                np.add(acc, operand, out=acc)
+            np.clip(acc, 0, 255, out=acc)
+        if self.float:
+            np.divide(acc, luts.SCALE, out=acc)
+        out[...] = acc
@@ -0,0 +1,112 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Pixel math of the InstaGIMP filters, independent of gimpfu.
+
+Each filter is a pure function mapping an HxWx3 or HxWx4 uint8 array and the
+filter parameters to a new array of the same shape, alpha is carried through.
+The same functions also accept a single pixel tuple together with its
+distance, which is what the pure-Python fallback uses when NumPy is missing.
+
+distance is the distance to the frame center divided by the frame diagonal
+(dmax), see instagimp.vignette. The filters are described by the stage lists
+of instagimp.spec, which compile into cached lookup tables, see
+instagimp.luts. Each filter function exposes its spec as filter.spec and the
+compiled tables as filter.tables(**params).
+"""
+
+from collections import OrderedDict
+
+from . import luts, spec as specs
+
+
+def from_spec(spec):
+    """Kernel function of the filter described by a spec.
+
+    The kernel is called as kernel(pixels, distance=None, out=None, **params),
+    missing parameters take the defaults of the spec and out is an optional
+    preallocated output array, see luts.pack().
+    """
+    def kernel(pixels, distance=None, out=None, **params):
+        return luts.apply(spec.tables(**params), pixels, distance, out)
+
+    # Named after the filter so that it pickles by reference.
+    kernel.__name__ = kernel.__qualname__ = spec.name
+    kernel.__doc__ = spec.doc
+    kernel.spec = spec
+    kernel.tables = spec.tables
+    return kernel
+
+
+andromeda = from_spec(specs.ANDROMEDA)
+chicago = from_spec(specs.CHICAGO)
+geneva = from_spec(specs.GENEVA)
+ghost = from_spec(specs.GHOST)
+sanfrancisco = from_spec(specs.SANFRANCISCO)
+sixities = from_spec(specs.SIXITIES)
+sunnyday = from_spec(specs.SUNNYDAY)
+
+# Filters by name, in menu order.
+FILTERS = OrderedDict((kernel.__name__, kernel) for kernel in
+                      (andromeda, chicago, geneva, ghost, sanfrancisco, sixities, sunnyday))
+
+
+def parameters(kernel):
+    """Return the parameters of a kernel and their defaults, in order.
+
+    The defaults are the ones of the plug-in register blocks.
+    """
+    return OrderedDict(kernel.spec.params)
+
+
+def parse_value(text):
+    """Parse a parameter value, comma separated values give a tuple."""
+    if "," in text:
+        return tuple(float(part) for part in text.split(","))
+    return float(text)
+
+
+def check_value(name, key, value):
+    """Return value if it has the shape of the default of parameter key of
+    filter name: a number, or a tuple of as many numbers."""
+    default = parameters(FILTERS[name])[key]
+    expected = len(default) if isinstance(default, tuple) else None
+    if (len(value) if isinstance(value, tuple) else None) != expected:
+        raise ValueError("parameter %s of %s takes %s, got %r" % (
+            key, name, "%d comma separated numbers" % expected if expected else "a single number", value))
+    return value
+
+
+def parse_params(name, assignments):
+    """Merge name=value assignments into the defaults of filter name."""
+    if name not in FILTERS:
+        raise ValueError("unknown filter %r, expected one of %s" % (name, ", ".join(FILTERS)))
+    params = parameters(FILTERS[name])
+    for assignment in assignments:
+        key, sep, value = assignment.partition("=")
+        if not sep or key not in params:
+            raise ValueError("unknown parameter %r for %s, expected one of %s"
+                             % (key, name, ", ".join(params)))
+        try:
+            value = parse_value(value)
+        except ValueError:
+            raise ValueError("parameter %s of %s takes numbers, got %r" % (key, name, value))
+        params[key] = check_value(name, key, value)
+    return params
@@ -0,0 +1,275 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Lookup tables for the non-spatial part of the filters.
+
+Apart from the radial terms, every filter only depends on the input value of
+a channel or on the sum of the three channels. For one parameter set a filter
+is compiled into 256-entry tables indexed by the channel value and 766-entry
+tables indexed by the channel sum, so applying it reduces to table lookups
+plus the vignette multiply-add. Compiled tables are cached per parameter set.
+
+Arrays are filtered tile by tile after a pre-scan, see pack_tiles(): fully
+transparent tiles are skipped, and the color of uniform tiles is looked up
+once before the vignette is added, so that cutouts and stickers cost in
+proportion to their visible content. The colors behind a fully transparent
+tile are kept, while the transparent pixels of the other tiles are filtered
+like the rest; regions.map_pixels() skips the same tiles without NumPy.
+"""
+
+import numbers
+
+from . import vignette
+from .cache import LRUCache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Compiled tables of the most recently used parameter sets.
+cache = LRUCache(maxsize=32)
+
+
+# Float pixels hold 0..1 values, the tables and functions work in 0..255.
+SCALE = 255.0
+
+# Side of the tiles of the pre-scan, that of GIMP's tiles.
+TILE = 64
+
+
+def _is_array(value):
+    return np is not None and isinstance(value, np.ndarray)
+
+
+def is_float(pixels):
+    """Whether pixels is a float array of 0..1 values, see instagimp.precision."""
+    return _is_array(pixels) and pixels.dtype.kind == "f"
+
+
+def checkColor(color):
+    """Clamp a channel, or an array of channels, to 0..255."""
+    if _is_array(color):
+        return np.clip(color, 0, 255)
+    if color > 255:
+        return 255
+    if color < 0:
+        return 0
+    return color
+
+
+def _sample(f, size):
+    """Tabulate f over 0..size-1, numbers and None are kept as they are."""
+    if f is None or not callable(f):
+        return f
+    if np is not None:
+        return np.asarray(f(np.arange(size, dtype=np.float64)), dtype=np.float64)
+    return [f(float(i)) for i in range(size)]
+
+
+class Tables(object):
+    """Lookup tables of one filter for one parameter set.
+
+    Output channel c is computed as
+
+        value[c][p_c] + total[c][s] + slope[c] * d + curve[c] * d * d
+
+    where p_c is input channel c, s the sum of the three input channels and
+    d the normalized distance to the center. value and total are given as
+    functions of p_c and s (or None), slope as a number or a function of s,
+    and curve as a number. The functions are kept to evaluate the filter on
+    float input, see evaluate().
+    """
+
+    def __init__(self, value=(None, None, None), total=(None, None, None), slope=(0, 0, 0), curve=(0, 0, 0)):
+        self.functions = (tuple(value), tuple(total), tuple(slope))
+        self.value = [_sample(f, 256) for f in value]
+        self.total = [_sample(f, 766) for f in total]
+        self.slope = [_sample(f, 766) for f in slope]
+        self.curve = list(curve)
+
+
+def _combine(value, total, slope, curve, d):
+    """value + total + slope * d + curve * d * d, skipping missing terms."""
+    acc = 0.0
+    if value is not None:
+        acc = value
+    if total is not None:
+        acc = acc + total
+    if not isinstance(slope, numbers.Number) or slope:
+        acc = acc + slope * d
+    if curve:
+        acc = acc + curve * d * d
+    return acc
+
+
+def channel_sum(pixels):
+    """Sum of the three channels of 8-bit pixels, the index of the total tables."""
+    if _is_array(pixels):
+        return np.add(np.add(pixels[..., 0], pixels[..., 1], dtype=np.uint16), pixels[..., 2], dtype=np.uint16)
+    return pixels[0] + pixels[1] + pixels[2]
+
+
+def lookup(tables, pixels, distance, sums=None):
+    """Unclamped output channels of 8-bit pixels, through the tables.
+
+    pixels is an HxWxC uint8 array or a pixel tuple, distance the matching
+    distance map or distance. sums is channel_sum(pixels) when the caller
+    already has it. Float pixels go through the functions instead, scaled to
+    0..255 so that the parameters keep their meaning.
+    """
+    if is_float(pixels):
+        return evaluate(tables, [pixels[..., c] * SCALE for c in range(3)], distance)
+    if _is_array(pixels):
+        p = [pixels[..., c] for c in range(3)]
+    else:
+        p = pixels[:3]
+    s = channel_sum(pixels) if sums is None else sums
+
+    channels = []
+    for c in range(3):
+        value, total, slope = tables.value[c], tables.total[c], tables.slope[c]
+        channels.append(_combine(None if value is None else value[p[c]],
+                                 None if total is None else total[s],
+                                 slope if isinstance(slope, numbers.Number) else slope[s],
+                                 tables.curve[c], distance))
+    return channels
+
+
+def evaluate(tables, channels, distance):
+    """Unclamped output channels of float input channels, through the functions.
+
+    Used when the input is not 8-bit, such as the intermediate values of a
+    pipeline of filters.
+    """
+    s = channels[0] + channels[1] + channels[2]
+    values, totals, slopes = tables.functions
+
+    out = []
+    for c in range(3):
+        value, total, slope = values[c], totals[c], slopes[c]
+        out.append(_combine(None if value is None else value(channels[c]),
+                            None if total is None else total(s),
+                            slope(s) if callable(slope) else slope,
+                            tables.curve[c], distance))
+    return out
+
+
+def pack(pixels, channels, out=None):
+    """Clamp and truncate channels into the layout of pixels.
+
+    Extra channels of pixels, such as alpha, are kept. Float pixels are
+    scaled back to 0..1 without truncation. out is an array of the shape and
+    type of pixels to write the result to, a new one by default.
+    """
+    if is_float(pixels):
+        out = _output(pixels, out)
+        for c in range(3):
+            out[..., c] = checkColor(channels[c]) / SCALE
+        return out
+    if _is_array(pixels):
+        out = _output(pixels, out)
+        for c in range(3):
+            # Assigning floats to the uint8 output truncates like int() did.
+            out[..., c] = checkColor(channels[c])
+        return out
+    return tuple(int(checkColor(channel)) for channel in channels) + tuple(pixels[3:])
+
+
+def _output(pixels, out):
+    if out is None:
+        return pixels.copy()
+    if out is not pixels and pixels.shape[-1] > 3:
+        out[..., 3:] = pixels[..., 3:]
+    return out
+
+
+def scan(pixels, tile=TILE):
+    """Classify the tiles of HxWxC pixels, row-major from the top left.
+
+    Returns (transparent, uniform), boolean arrays with a row per row of
+    tiles: tiles whose alpha is 0 everywhere, and tiles of a single color
+    and alpha. Pixels without alpha have no transparent tiles.
+    """
+    height, width, channels = pixels.shape
+    starts = np.arange(0, width, tile)
+    high, low = [], []
+    for y in range(0, height, tile):
+        band = pixels[y:y + tile]
+        high.append(np.maximum.reduceat(band.max(axis=0), starts, axis=0))
+        low.append(np.minimum.reduceat(band.min(axis=0), starts, axis=0))
+    high, low = np.array(high), np.array(low)
+    transparent = high[..., 3] == 0 if channels > 3 else np.zeros(high.shape[:2], dtype=bool)
+    return transparent, (high == low).all(axis=-1)
+
+
+def pack_tiles(pixels, distance, channels, out=None, tile=TILE):
+    """pack(pixels, channels(pixels, distance), out), skipping the tiles it can.
+
+    channels maps pixels and their distance map to the unclamped output
+    channels, like lookup(). Fully transparent tiles are left as they are.
+    Uniform tiles get channels() of their first pixel with their whole
+    distance map, which broadcasts to the same values as the full lookup.
+    The other tiles of a row are computed in runs.
+    """
+    if not _is_array(pixels) or pixels.ndim != 3 or pixels.shape[0] * pixels.shape[1] <= tile * tile:
+        return pack(pixels, channels(pixels, distance), out)
+    transparent, uniform = scan(pixels, tile)
+    if not (transparent.any() or uniform.any()):
+        return pack(pixels, channels(pixels, distance), out)
+
+    distance = np.broadcast_to(distance, pixels.shape[:2])
+    copied = out is None
+    out = pixels.copy() if copied else out
+    for i, y in enumerate(range(0, pixels.shape[0], tile)):
+        rows = slice(y, y + tile)
+        j, count = 0, transparent.shape[1]
+        while j < count:
+            if transparent[i, j]:
+                if not copied:
+                    out[rows, j * tile:(j + 1) * tile] = pixels[rows, j * tile:(j + 1) * tile]
+                j += 1
+                continue
+            if uniform[i, j]:
+                cols = slice(j * tile, (j + 1) * tile)
+                block = pixels[rows, cols]
+                pack(block, channels(block[:1, :1], distance[rows, cols]), out[rows, cols])
+                j += 1
+                continue
+            end = j + 1
+            while end < count and not (transparent[i, end] or uniform[i, end]):
+                end += 1
+            cols = slice(j * tile, end * tile)
+            pack(pixels[rows, cols], channels(pixels[rows, cols], distance[rows, cols]), out[rows, cols])
+            j = end
+    return out
+
+
+def apply(tables, pixels, distance=None, out=None):
+    """Apply compiled tables to pixels.
+
+    pixels is either an HxWx3/4 uint8 or float array, in which case distance
+    defaults to the distance map of the whole frame, or a single pixel tuple
+    together with its distance. Extra channels such as alpha are kept. The
+    result of an array goes to out when given, see pack() and pack_tiles().
+    """
+    if distance is None and _is_array(pixels):
+        distance = vignette.window(pixels.shape[1], pixels.shape[0])
+    return pack_tiles(pixels, distance, lambda pixels, distance: lookup(tables, pixels, distance), out)
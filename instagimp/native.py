@@ -0,0 +1,285 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Filters run as GIMP's own operations, without pixel math in Python.
+
+The Tables of a filter are turned into a Plan of procedure calls on the
+drawable:
+
+* the value term of each channel, such as the gain of alpha and beta, is a
+  curves call on the layer;
+* the total term, a function of the channel sum such as the average of
+  ghost, geneva and chicago or a tone curve, is a desaturate to the average
+  followed by curves, on the layer itself when the filter has no value term
+  and otherwise on copies merged back in addition and subtract modes;
+* the radial terms (whitecenter, blackoutside, whiteoutside, greenoutside)
+  are a radial black to white gradient mapped by curves, merged in addition
+  mode where they lighten and subtract mode where they darken.
+
+The selection limits the curves and desaturate calls and masks the merged
+layers. Every step works on 8-bit values and clamps, unlike the reference
+path which sums the terms before clamping once, and slopes that depend on
+the channel sum (andromeda's blue) are taken at mid-gray. simulate() models
+the calls with NumPy, error_bound() compares that with the reference. With
+the default parameters, over 64^3 colors at every distance, the largest and
+mean differences in 8-bit levels are
+
+    andromeda 88 (14.1)    chicago 2 (0.5)    geneva 50 (4.7)    ghost 25 (1.0)
+    sanfrancisco 87 (11.3)    sixities 60 (7.7)    sunnyday 90 (11.5)
+
+the large ones where a value is clamped before the vignette is added:
+highlights that blackoutside then darkens, shadows that whiteoutside
+lifts. Only chicago is a faithful rendering, the backend of the others is
+an approximation for interactive work on huge canvases, with the reference
+one for final renders. The procedures of the plug-in ask for the backend
+and give the largest difference of each filter with its option.
+"""
+
+import time
+
+from . import regions, vignette
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Channel sum at which slopes depending on it are taken.
+MID_GRAY = 3 * 128
+
+# GIMP 2.8 enums, this package does not import gimpfu.
+HISTOGRAM_CHANNELS = (1, 2, 3)
+DESATURATE_AVERAGE = 2
+ADDITION_MODE, SUBTRACT_MODE = 7, 8
+GRADIENT_RADIAL = 2
+ADD_SELECTION_MASK = 4
+CLIP_TO_BOTTOM_LAYER = 2
+
+
+def _curve(f, scale=1.0):
+    """f at 0..255 times scale, clamped and rounded to a uint8 curve."""
+    x = np.arange(256, dtype=np.float64) * scale
+    return np.clip(np.rint(f(x) + x * 0.0), 0, 255).astype(np.uint8)
+
+
+def _split(f, scale=1.0):
+    """Curves of the positive and negative parts of f, None when zero everywhere."""
+    add, sub = _curve(f, scale), _curve(lambda x: -f(x), scale)
+    return add if add.any() else None, sub if sub.any() else None
+
+
+class Plan(object):
+    """The GIMP operations of a filter, as 256 entry curves per channel.
+
+    value[c] maps the channel, total_add/total_sub[c] the channel average
+    (after a desaturate) and radial_add/radial_sub[c] the radial gradient g,
+    which is 255 at the corners, where d = g / 510. Missing curves are None.
+    """
+
+    def __init__(self, tables, slope_at=MID_GRAY):
+        values, totals, slopes = tables.functions
+        zero = lambda x: x * 0.0
+        self.has_value = any(f is not None for f in values)
+        self.has_total = any(f is not None for f in totals)
+        self.value = [_curve(f or zero) for f in values] if self.has_value else None
+        self.total_add, self.total_sub = [], []
+        for f in totals:
+            add, sub = _split(f or zero, 3.0)
+            self.total_add.append(add)
+            self.total_sub.append(sub)
+        self.radial_add, self.radial_sub = [], []
+        for slope, curve in zip(slopes, tables.curve):
+            slope = slope(float(slope_at)) if callable(slope) else slope
+            add, sub = _split(lambda d, slope=slope, curve=curve: slope * d + curve * d * d, 1 / 510.0)
+            self.radial_add.append(add)
+            self.radial_sub.append(sub)
+
+    @classmethod
+    def of(cls, kernel, params=None):
+        """Plan of a kernel from instagimp.kernels and its parameters."""
+        return cls(kernel.tables(**(params or {})))
+
+    def steps(self):
+        """The operations in order, as (kind, curves) with kind one of "value",
+        "average", "total_add", "total_sub", "radial_add" and "radial_sub"."""
+        result = []
+        if not self.has_value:
+            # Desaturate the layer itself and map the average.
+            result.append(("average", [c if c is not None else np.zeros(256, np.uint8) for c in self.total_add]))
+        else:
+            result.append(("value", self.value))
+            for kind, curves in (("total_add", self.total_add), ("total_sub", self.total_sub)):
+                if self.has_total and any(c is not None for c in curves):
+                    result.append((kind, curves))
+        for kind, curves in (("radial_add", self.radial_add), ("radial_sub", self.radial_sub)):
+            if any(c is not None for c in curves):
+                result.append((kind, curves))
+        return result
+
+
+def _lookup(curves, channels):
+    zero = np.zeros(256, np.uint8)
+    return [(zero if curve is None else curve)[x] for curve, x in zip(curves, channels)]
+
+
+def simulate(plan, pixels, distance):
+    """The result of the operations of plan on HxWxC uint8 pixels, with NumPy.
+
+    Models the 8-bit GIMP 2.8 operations: curves are table lookups, the
+    average desaturate rounds (r + g + b) / 3, the gradient rounds 510 * d,
+    and the addition and subtract modes clamp.
+    """
+    rgb = pixels[..., :3].astype(np.int32)
+    average = (rgb.sum(axis=-1) + 1) // 3
+    gradient = np.clip(np.rint(np.asarray(distance) * 510.0), 0, 255).astype(np.intp)
+    gradient = np.broadcast_to(gradient, average.shape)
+    channels = [rgb[..., c] for c in range(3)]
+    for kind, curves in plan.steps():
+        if kind == "value":
+            channels = [c.astype(np.int32) for c in _lookup(curves, channels)]
+        elif kind == "average":
+            channels = [c.astype(np.int32) for c in _lookup(curves, [average] * 3)]
+        else:
+            source = average if kind.startswith("total") else gradient
+            sign = 1 if kind.endswith("add") else -1
+            terms = _lookup(curves, [source] * 3)
+            channels = [np.clip(c + sign * t.astype(np.int32), 0, 255) for c, t in zip(channels, terms)]
+    out = pixels.copy()
+    for c in range(3):
+        out[..., c] = channels[c]
+    return out
+
+
+def error_bound(kernel, params=None, pixels=None):
+    """Largest difference in 8-bit levels between the native operations and kernel.
+
+    pixels default to a frame of 64^3 colors, so the vignette covers every
+    distance as well.
+    """
+    if pixels is None:
+        from . import cube
+        pixels = cube.test_pixels(4)
+    distance = vignette.window(pixels.shape[1], pixels.shape[0])
+    reference = kernel(pixels, distance=distance, **(params or {}))
+    native = simulate(Plan.of(kernel, params), pixels, distance)
+    return int(np.abs(reference[..., :3].astype(np.int32) - native[..., :3]).max())
+
+
+def _procedure(pdb, *names):
+    """The first procedure of the PDB among names, for GIMP 2.10 and 2.8."""
+    for name in names:
+        try:
+            return getattr(pdb, name)
+        except AttributeError:
+            pass
+    raise RuntimeError("none of the procedures %s is available" % ", ".join(names))
+
+
+def _curves(pdb, drawable, curves):
+    explicit = _procedure(pdb, "gimp_drawable_curves_explicit", "gimp_curves_explicit")
+    for channel, curve in zip(HISTOGRAM_CHANNELS, curves):
+        if curve is None:
+            curve = np.zeros(256, np.uint8)
+        if explicit.proc_name == "gimp-drawable-curves-explicit":
+            explicit(drawable, channel, 256, [v / 255.0 for v in curve.tolist()])
+        else:
+            explicit(drawable, channel, 256, curve.tolist())
+
+
+def _desaturate(pdb, drawable):
+    _procedure(pdb, "gimp_drawable_desaturate", "gimp_desaturate_full")(drawable, DESATURATE_AVERAGE)
+
+
+def _gradient(pdb, drawable, frame):
+    """Fill drawable with a black center to white corners radial gradient."""
+    x, y, width, height = frame
+    cx, cy = x + width / 2.0, y + height / 2.0
+    radius = (width * width + height * height) ** 0.5 / 2.0
+    pdb.gimp_context_push()
+    try:
+        pdb.gimp_context_set_foreground((0, 0, 0))
+        pdb.gimp_context_set_background((255, 255, 255))
+        pdb.gimp_edit_blend(drawable, 0, 0, GRADIENT_RADIAL, 100, 0, 0, False, False, 1, 0, False,
+                            cx, cy, cx + radius, cy)
+    finally:
+        pdb.gimp_context_pop()
+
+
+def _insert(pdb, image, base, layer):
+    """Add layer to image right above base."""
+    pdb.gimp_image_insert_layer(image, layer, None, pdb.gimp_image_get_item_position(image, base))
+
+
+def _merge(pdb, image, layer, mode):
+    """Merge layer down in mode, masked by the selection, returns the result."""
+    pdb.gimp_layer_set_mode(layer, mode)
+    if not pdb.gimp_selection_is_empty(image):
+        pdb.gimp_layer_add_mask(layer, pdb.gimp_layer_create_mask(layer, ADD_SELECTION_MASK))
+    return pdb.gimp_image_merge_down(image, layer, CLIP_TO_BOTTOM_LAYER)
+
+
+def apply_layers(pdb, layers, kernel, params=None, center="image"):
+    """Run kernel on each of layers like regions.apply_frames(), returns the Throughput."""
+    start = time.time()
+    pixels = 0
+    for layer in layers:
+        x, y, width, height = regions.bounds(layer)
+        pixels += width * height
+        apply(pdb, layer.image, layer, kernel, params, center)
+    return regions.Throughput(len(layers), pixels, time.time() - start)
+
+
+def apply(pdb, image, layer, kernel, params=None, center="layer"):
+    """Run kernel on layer as GIMP operations, returns the resulting layer.
+
+    pdb is gimpfu's. The layer is replaced by the merged result when the
+    filter needs more than curves and a desaturate. center is that of
+    regions.apply(), the vignette is centered on the layer, the selection
+    or the image.
+    """
+    plan = Plan.of(kernel, params)
+    frame = regions.frame(layer, regions.bounds(layer), center)
+    steps = plan.steps()
+
+    # Copies for the total terms, stacked above the layer before its own
+    # curves change it, the first one to merge lowest.
+    copies = []
+    for kind, curves in reversed([step for step in steps if step[0].startswith("total")]):
+        copy = pdb.gimp_layer_copy(layer, True)
+        _insert(pdb, image, layer, copy)
+        copies.insert(0, copy)
+
+    for kind, curves in steps:
+        if kind == "average":
+            _desaturate(pdb, layer)
+        if kind in ("value", "average"):
+            _curves(pdb, layer, curves)
+            continue
+        if kind.startswith("total"):
+            term = copies.pop(0)
+            _desaturate(pdb, term)
+        else:
+            term = pdb.gimp_layer_new(image, layer.width, layer.height, 0, "vignette", 100, 0)
+            pdb.gimp_layer_set_offsets(term, *layer.offsets)
+            _insert(pdb, image, layer, term)
+            _gradient(pdb, term, frame)
+        _curves(pdb, term, curves)
+        layer = _merge(pdb, image, term, ADDITION_MODE if kind.endswith("add") else SUBTRACT_MODE)
+    return layer
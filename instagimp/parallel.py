@@ -0,0 +1,124 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Tiled multi-core execution of the kernels.
+
+Every kernel is a per-pixel function of the pixel and its position, so an
+image can be cut into tiles that are filtered independently as long as each
+tile gets its own window of the distance map. Tiles run on a thread pool by
+default: the kernels spend their time in NumPy lookups and arithmetic which
+release the GIL. A process pool is available for callers that can afford to
+copy the tiles to the workers. Results always come back in tile order.
+"""
+
+import multiprocessing
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+from . import vignette
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def cpu_count():
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def make_pool(workers=None, kind="thread", initializer=None):
+    """Create a thread or process pool of workers (default: one per CPU).
+
+    initializer() runs once in every worker as it starts.
+    """
+    workers = workers or cpu_count()
+    if kind == "thread":
+        return ThreadPool(workers, initializer)
+    if kind == "process":
+        return multiprocessing.Pool(workers, initializer)
+    raise ValueError("unknown pool kind %r" % kind)
+
+
+def ordered(pool, func, jobs, window):
+    """Yield func(job) for every job, in order.
+
+    jobs are consumed on the calling thread, which matters for pixel regions
+    that may only be touched by the plug-in's main thread, and at most window
+    jobs are in flight at any time.
+    """
+    pending = deque()
+    for job in jobs:
+        pending.append(pool.apply_async(func, (job,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def tiles(width, height, tile_width, tile_height):
+    """Yield the (x, y, w, h) tiles covering the frame in row-major order."""
+    for y in range(0, height, tile_height):
+        for x in range(0, width, tile_width):
+            yield x, y, min(tile_width, width - x), min(tile_height, height - y)
+
+
+def run_tile(job):
+    """Filter one tile, job is (kernel, params, block, frame, x, y[, out]).
+
+    frame is the (width, height) of the whole image, (x, y) the position of
+    the block in it, so that the vignette stays centered on the image. The
+    result is written to out when the job has one, see luts.pack().
+    """
+    kernel, params, block, frame, x, y = job[:6]
+    h, w = block.shape[:2]
+    distance = vignette.window(frame[0], frame[1], x, y, w, h)
+    if len(job) > 6:
+        return kernel(block, distance=distance, out=job[6], **params)
+    return kernel(block, distance=distance, **params)
+
+
+def map_tiles(pixels, kernel, params, workers=None, kind="thread", tile_size=None, out=None):
+    """Apply kernel to an HxWxC array tile by tile on a pool.
+
+    tile_size is (tile_width, tile_height), by default strips of 128 full
+    rows. Results are written to out (a new array by default) in tile order.
+    """
+    height, width = pixels.shape[:2]
+    tile_width, tile_height = tile_size or (width, 128)
+    workers = workers or cpu_count()
+    if out is None:
+        out = np.empty_like(pixels)
+
+    boxes = list(tiles(width, height, tile_width, tile_height))
+    jobs = ((kernel, params, pixels[y:y + h, x:x + w], (width, height), x, y) for x, y, w, h in boxes)
+
+    pool = make_pool(workers, kind)
+    try:
+        for i, result in enumerate(ordered(pool, run_tile, jobs, 2 * workers)):
+            x, y, w, h = boxes[i]
+            out[y:y + h, x:x + w] = result
+    finally:
+        pool.close()
+        pool.join()
+    return out
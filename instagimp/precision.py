@@ -0,0 +1,157 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""Pixel formats of high bit depth drawables.
+
+GIMP 2.10 images can hold 8, 16 or 32-bit integers, or half, single or
+double floats, with linear or perceptual (sRGB) values. A Format decodes the
+bytes of a pixel region into what the kernels work on and encodes the
+result back in the same precision. 8-bit perceptual data is handed over as
+it is, which keeps the historical output bit for bit, and so is float32
+perceptual data, which the kernels work on already. Everything else
+becomes float32 perceptual values in 0..1, where the kernels evaluate the
+same functions as the tables without truncating to 8 bits (see
+luts.is_float()), linear data being converted to perceptual and back since
+the filters were designed on perceptual values.
+
+Only one strip is converted at a time, so high bit depth images never get a
+full size converted copy.
+"""
+
+from . import bridge
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# GimpPrecision values, see pdb.gimp_image_get_precision(): component type
+# and whether the values are linear.
+PRECISIONS = {
+    100: ("u8", True), 150: ("u8", False),
+    200: ("u16", True), 250: ("u16", False),
+    300: ("u32", True), 350: ("u32", False),
+    500: ("half", True), 550: ("half", False),
+    600: ("float", True), 650: ("float", False),
+    700: ("double", True), 750: ("double", False),
+}
+
+# NumPy types of the components, in the byte order of the machine like GIMP.
+DTYPES = {"u8": "u1", "u16": "=u2", "u32": "=u4", "half": "=f2", "float": "=f4", "double": "=f8"}
+
+# Precision assumed from the component size when the image does not tell.
+DEFAULTS = {1: "u8", 2: "u16", 4: "float", 8: "double"}
+
+
+def to_perceptual(x):
+    """sRGB encoding of linear values, as float32."""
+    low = x <= 0.0031308
+    out = np.power(np.maximum(x, 0.0031308), 1 / 2.4, dtype=np.float32)
+    out *= 1.055
+    out -= 0.055
+    out[low] = x[low] * 12.92
+    return out
+
+
+def to_linear(x):
+    """Linear values of sRGB encoded ones, as float32."""
+    low = x <= 0.04045
+    out = np.power((np.maximum(x, 0.04045) + 0.055) / 1.055, 2.4, dtype=np.float32)
+    out[low] = x[low] / 12.92
+    return out
+
+
+class Format(object):
+    """Components of a drawable: type ("u8", "u16", ... "double"), linear or not."""
+
+    def __init__(self, component="u8", linear=False, channels=3):
+        if component not in DTYPES:
+            raise ValueError("unknown component type %r" % component)
+        self.component, self.linear, self.channels = component, linear, channels
+        self.dtype = np.dtype(DTYPES[component])
+        self.native = component == "u8" and not linear
+        # Components the kernels take and return as they are, without conversion.
+        self.direct = component in ("u8", "float") and not linear
+
+    def __repr__(self):
+        return "Format(%r, linear=%r, channels=%d)" % (self.component, self.linear, self.channels)
+
+    @property
+    def bpp(self):
+        return self.dtype.itemsize * self.channels
+
+    def decode(self, data, rows, width):
+        """Pixels of a pixel region as uint8, or float32 perceptual 0..1 values.
+
+        8-bit and float32 perceptual data is returned as a view of data,
+        without copy.
+        """
+        pixels = bridge.view(data, rows, width, self.channels, self.dtype)
+        if self.direct:
+            return pixels
+        out = pixels.astype(np.float32)
+        bridge.counters.allocated(out.nbytes)
+        bridge.counters.copied(out.nbytes)
+        if self.dtype.kind == "u":
+            out /= np.iinfo(self.dtype).max
+        if self.linear:
+            out[..., :3] = to_perceptual(out[..., :3])
+        return out
+
+    def encode(self, block, out=None):
+        """A block returned by a kernel as an array in this format, for bridge.assign().
+
+        Blocks already of the type of 8-bit or float32 perceptual components
+        are returned as they are, others are converted into out, an array of
+        the shape of block and the type of the components, or a new one.
+        """
+        if self.direct and block.dtype == self.dtype:
+            return block
+        if self.linear:
+            block[..., :3] = to_linear(block[..., :3])
+        if out is None:
+            out = np.empty(block.shape, dtype=self.dtype)
+            bridge.counters.allocated(out.nbytes)
+        if self.dtype.kind == "u":
+            top = np.iinfo(self.dtype).max
+            block = np.clip(np.rint(block * np.float64(top)), 0, top)
+        out[...] = block
+        bridge.counters.copied(out.nbytes)
+        return out
+
+
+def of_layer(layer, precision=None):
+    """Format of a drawable, from the GimpPrecision of its image.
+
+    precision defaults to layer.image.precision when GIMP provides it,
+    otherwise, or when the pixel regions do not have components of its
+    size, it is guessed from the bytes per pixel: 8-bit perceptual on GIMP
+    2.8 and for the 8-bit data GIMP hands to plug-ins that did not enable
+    high precision, even from a 16-bit or float image.
+    """
+    channels = 4 if layer.has_alpha else 3
+    size = layer.bpp // channels
+    if precision is None:
+        precision = getattr(getattr(layer, "image", None), "precision", None)
+    if precision is not None and np.dtype(DTYPES[PRECISIONS[precision][0]]).itemsize == size:
+        component, linear = PRECISIONS[precision]
+    else:
+        component = DEFAULTS.get(size, "u8")
+        linear = component in ("float", "double")
+    return Format(component, linear, channels)
@@ -0,0 +1,142 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""Downscaled previews for tuning filter parameters.
+
+A preview runs a kernel on a proxy of the image whose longest side is a few
+hundred pixels, which takes milliseconds instead of a pass over the whole
+image. Each proxy pixel is the box average of the pixels it covers and gets
+the distance map value at their center in the full frame, so the vignette is
+computed in the coordinates of the full-resolution result and lands at the
+same place. Preview.refine() renders proxies of growing size up to the full
+resolution, for dialogs that show the first one at once and swap in the
+next ones as they come. The proxies are rendered incrementally, moving a
+vignette slider only recomputes the vignette, see instagimp.incremental.
+"""
+
+from . import incremental, luts, vignette
+
+# Longest side of the first proxy and growth factor of the next ones.
+SIZE = 256
+FACTOR = 2
+
+# Rows read from the source at once while building a proxy.
+STRIP_ROWS = 64
+
+
+def bounds(size, count):
+    """Edges of count spans of nearly equal length covering size pixels."""
+    return (luts.np.arange(count + 1, dtype=luts.np.int64) * size) // count
+
+
+def proxy_shape(width, height, size):
+    """(width, height) of the proxy of a frame with longest side size."""
+    scale = min(1.0, float(size) / max(width, height))
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+
+def box_average(pixels, rows, cols):
+    """Box average of pixels over the spans between the given edges."""
+    np = luts.np
+    dtype = np.float64 if luts.is_float(pixels) else np.uint64
+    sums = np.add.reduceat(pixels, rows[:-1], axis=0, dtype=dtype)
+    sums = np.add.reduceat(sums, cols[:-1], axis=1)
+    counts = (np.diff(rows)[:, np.newaxis] * np.diff(cols)[np.newaxis, :])[..., np.newaxis]
+    if luts.is_float(pixels):
+        return (sums / counts).astype(pixels.dtype)
+    return ((sums + counts // 2) // counts).astype(np.uint8)
+
+
+def centers(edges):
+    """Center pixel coordinate of each span."""
+    return (edges[:-1] + edges[1:] - 1) / 2.0
+
+
+class Preview(object):
+    """Proxies of one image kept while its filter parameters are tuned.
+
+    src is a strip source with width, height, channels and read(y, rows),
+    such as stream.ArraySource, a file from stream.source() or the
+    regions.Source of a GIMP drawable. Proxies and their distance maps are
+    built once per size, rendering them again with other parameters only
+    runs the stages of the kernel whose tables changed. The full resolution
+    result is rendered by the kernel without keeping intermediates.
+    """
+
+    def __init__(self, src, size=SIZE, factor=FACTOR):
+        self.src = src
+        self.width, self.height = src.width, src.height
+        self.size = size
+        self.factor = factor
+        self.proxies = {}
+        # Incremental renders of the proxies with the last kernel, by size.
+        self.kernel, self.renders = None, {}
+
+    def sizes(self):
+        """Longest sides of the successive proxies, ending at full resolution."""
+        full = max(self.width, self.height)
+        size = min(self.size, full)
+        while size < full:
+            yield size
+            size *= self.factor
+        yield full
+
+    def proxy(self, size):
+        """(pixels, distance) of the proxy with longest side size."""
+        if size not in self.proxies:
+            w, h = proxy_shape(self.width, self.height, size)
+            full = (w, h) == (self.width, self.height)
+            rows = bounds(self.height, h)
+            cols = bounds(self.width, w)
+
+            # Read whole spans of rows, about STRIP_ROWS rows at a time.
+            blocks = []
+            first = 0
+            while first < h:
+                last = first + 1
+                while last < h and rows[last + 1] - rows[first] <= STRIP_ROWS:
+                    last += 1
+                y = int(rows[first])
+                block = self.src.read(y, int(rows[last]) - y)
+                blocks.append(block if full else box_average(block, rows[first:last + 1] - y, cols))
+                first = last
+
+            if full:
+                distance = vignette.window(self.width, self.height)
+            else:
+                distance = vignette.grid(self.width, self.height, centers(cols), centers(rows))
+            self.proxies[size] = luts.np.concatenate(blocks), distance
+        return self.proxies[size]
+
+    def render(self, kernel, params, size=None):
+        """Filtered proxy with longest side size (default: the first one)."""
+        size = size or next(self.sizes())
+        pixels, distance = self.proxy(size)
+        if size >= max(self.width, self.height):
+            return kernel(pixels, distance=distance, **params)
+        if kernel is not self.kernel:
+            self.kernel, self.renders = kernel, {}
+        if size not in self.renders:
+            self.renders[size] = incremental.Render(pixels, kernel, distance)
+        return self.renders[size](**params)
+
+    def refine(self, kernel, params):
+        """Yield filtered proxies of growing size, the last one is the full result."""
+        for size in self.sizes():
+            yield self.render(kernel, params, size)
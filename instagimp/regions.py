@@ -0,0 +1,345 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Bulk pixel-region I/O for GIMP drawables.
+
+The filters used to go through layer.get_pixel() and layer.set_pixel() once
+per pixel, which costs one PDB round trip per call. The helpers below read
+and write whole rows of tiles through pixel regions instead, write the result
+to the drawable's shadow buffer and merge it once at the end.
+
+Only the bounds of the selection are read, filtered and updated. Merging the
+shadow buffer blends it into the drawable through the selection mask, so
+feathered and irregular selections come out right without further work.
+"""
+
+import functools
+import time
+from array import array
+from collections import namedtuple
+
+from . import bridge, luts, parallel, stream, vignette
+from . import precision as formats
+
+# GIMP tiles are 64x64 pixels, reading 64 rows at once maps whole tile rows.
+TILE_HEIGHT = 64
+
+# Default memory budget of the strips in flight, about two strips per worker
+# for layers 4096 pixels wide on 8 cores.
+MAX_BYTES = 256 << 20
+
+# Where the vignette is centered: on the layer, on the selection bounds taken
+# as the frame of the picture, or on the image canvas.
+CENTERS = ("layer", "selection", "image")
+
+
+class Throughput(namedtuple("Throughput", "layers pixels seconds")):
+    """Layers and pixels filtered by one call, and the time it took."""
+
+    def __str__(self):
+        megapixels = self.pixels / 1e6
+        return "%d layers, %.1f MP in %.2f s (%.1f MP/s)" % (self.layers, megapixels, self.seconds,
+                                                            megapixels / max(self.seconds, 1e-9))
+
+
+def visible_layers(image):
+    """Visible RGB layers of image from the top, inside visible layer groups too."""
+    def walk(layers):
+        for layer in layers:
+            if not layer.visible:
+                continue
+            children = getattr(layer, "layers", None)
+            if children is not None:
+                for child in walk(children):
+                    yield child
+            elif _is_rgb(layer):
+                yield layer
+    return list(walk(image.layers))
+
+
+def active_layers(images):
+    """Active RGB layer of each image, skipping images without one."""
+    return [image.active_layer for image in images
+            if image.active_layer is not None and _is_rgb(image.active_layer)]
+
+
+def _is_rgb(layer):
+    return getattr(layer, "is_rgb", True)
+
+
+def strips(height, strip_height=TILE_HEIGHT, start=0):
+    """Yield (y, rows) for strips covering height rows from start.
+
+    The strips are cut on multiples of strip_height so that they map whole
+    rows of tiles.
+    """
+    y, end = start, start + height
+    while y < end:
+        rows = min(strip_height - y % strip_height, end - y)
+        yield y, rows
+        y += rows
+
+
+def tobytes(buf):
+    """Serialize an array for a pixel region (tostring() on Python 2)."""
+    if hasattr(buf, "tobytes"):
+        return buf.tobytes()
+    return buf.tostring()
+
+
+def bounds(layer):
+    """(x, y, width, height) of the selection in layer, or the whole layer."""
+    x1, y1, x2, y2 = getattr(layer, "mask_bounds", (0, 0, layer.width, layer.height))
+    return x1, y1, x2 - x1, y2 - y1
+
+
+def frame(layer, box, center="layer"):
+    """(x, y, width, height) of the frame the vignette is centered on.
+
+    The frame is given in layer coordinates, for center="image" it is the
+    image canvas as seen from the layer offsets.
+    """
+    if center not in CENTERS:
+        raise ValueError("unknown vignette center %r, expected one of %s" % (center, ", ".join(CENTERS)))
+    if center == "selection":
+        return box
+    if center == "image":
+        x, y = layer.offsets
+        return -x, -y, layer.image.width, layer.image.height
+    return 0, 0, layer.width, layer.height
+
+
+def transparent_tiles(data, width, rows, bpp):
+    """Columns of the tiles of a strip whose alpha is 0 everywhere.
+
+    data holds rows x width pixels of bpp bytes, the columns count tiles of
+    luts.TILE pixels from the left. Like luts.pack_tiles(), only strips
+    larger than one tile are split and only RGBA pixels have transparent tiles.
+    """
+    if bpp != 4 or width * rows <= luts.TILE * luts.TILE:
+        return frozenset()
+    alpha = data[3::bpp]
+    return frozenset(
+        j // luts.TILE for j in range(0, width, luts.TILE)
+        if not any(any(alpha[y * width + j:y * width + min(j + luts.TILE, width)]) for y in range(rows)))
+
+
+def map_pixels(layer, color, progress=None, box=None):
+    """Replace every pixel of layer in box by color(pixel, x, y).
+
+    color receives the pixel as a tuple and returns the new (r, g, b) as
+    integers in 0..255, extra channels such as alpha are kept as they are.
+    Fully transparent tiles are skipped, as luts.pack_tiles() does for arrays.
+    box is an (x, y, width, height) rectangle, by default the selection
+    bounds. The rectangle is updated once when all strips have been written.
+    """
+    x0, y0, width, height = box = box or bounds(layer)
+    bpp = layer.bpp
+
+    # Source and shadow regions over the rectangle.
+    src = layer.get_pixel_rgn(x0, y0, width, height, False, False)
+    dst = layer.get_pixel_rgn(x0, y0, width, height, True, True)
+
+    for y1, rows in strips(height, TILE_HEIGHT, y0):
+        # Update the progress bar.
+        if progress is not None:
+            progress(float(y1 - y0) / float(height))
+
+        data = array("B", src[x0:x0 + width, y1:y1 + rows])
+        skip = transparent_tiles(data, width, rows, bpp)
+        i = 0
+        for y in range(y1, y1 + rows):
+            for x in range(x0, x0 + width):
+                if (x - x0) // luts.TILE not in skip:
+                    data[i], data[i + 1], data[i + 2] = color(tuple(data[i:i + bpp]), x, y)
+                i += bpp
+        dst[x0:x0 + width, y1:y1 + rows] = tobytes(data)
+
+    merge(layer, box)
+
+
+def apply(layer, kernel, params, progress=None, workers=None, center="layer", precision=None,
+          max_bytes=MAX_BYTES):
+    """Run a kernel from instagimp.kernels with params over the selection.
+
+    Strips are read and written on the calling thread and handed to the
+    kernel as uint8 arrays together with their window of the distance map,
+    on a pool of workers threads (default: one per CPU). The vignette is
+    centered on the layer or, with center="selection", fitted to the
+    selection bounds. High bit depth drawables are filtered in their own
+    precision, the GimpPrecision of the image, when not given, is taken from
+    layer.image.precision or guessed, see precision.of_layer(). Without
+    NumPy the kernel's tables are compiled once and looked up pixel by pixel
+    through map_pixels(). The strips in flight take about max_bytes, see
+    budget(). Returns the Throughput.
+    """
+    return apply_frames([layer], kernel, params, progress, workers, center, precision, max_bytes)
+
+
+def budget(width, workers, max_bytes=MAX_BYTES):
+    """(window, rows): strips in flight and rows per strip within max_bytes.
+
+    The window + 1 strips of width pixels, the ones in flight and the one
+    being written back, fit in max_bytes, see stream.strip_rows(). Strips
+    are a row of tiles high, taller ones are slower, and only get shorter
+    when two of them do not fit; the tiles skipped by luts.pack_tiles() are
+    then as short as the strips.
+    """
+    rows = stream.strip_rows(width, max_bytes, 2)
+    if rows < TILE_HEIGHT:
+        return 1, rows
+    window = max(1, min(2 * workers, stream.strip_rows(width, max_bytes) // TILE_HEIGHT - 1))
+    return window, TILE_HEIGHT
+
+
+def apply_frames(layers, kernel, params, progress=None, workers=None, center="image", precision=None,
+                 max_bytes=MAX_BYTES):
+    """Run a kernel over several layers, such as the frames of an animation.
+
+    The strips of all layers go through one pool in a single stream, so the
+    next layer is read while the last strips of the previous one are being
+    filtered, and each layer is merged as soon as it is complete. The tables
+    and the distance map are compiled once for all frames of the same size.
+    By default the vignette is centered on the image, whatever the offsets
+    of the layers, see frame(). The window of strips in flight and their
+    height follow from max_bytes and the widest layer, see budget(). Returns
+    the Throughput of the run.
+    """
+    start = time.time()
+    layer_boxes = [bounds(layer) for layer in layers]
+    workers = workers or parallel.cpu_count()
+    window, strip_height = budget(max([box[2] for box in layer_boxes] or [1]), workers, max_bytes)
+    plan = []
+    for layer, box in zip(layers, layer_boxes):
+        plan.append((layer, box, frame(layer, box, center), list(strips(box[3], strip_height, box[1]))))
+    total = float(sum(box[3] for _, box, _, _ in plan)) or 1.0
+    pixels = sum(box[2] * box[3] for _, box, _, _ in plan)
+
+    if luts.np is None:
+        if any(layer.bpp not in (3, 4) for layer in layers):
+            raise RuntimeError("high bit depth drawables need NumPy")
+        if hasattr(kernel, "tables"):
+            tables = kernel.tables(**params)
+            kernel, params = functools.partial(luts.apply, tables), {}
+
+        done = 0
+        for layer, box, (fx, fy, fw, fh), _ in plan:
+            def color(pixel, x, y, fx=fx, fy=fy, fw=fw, fh=fh):
+                return kernel(pixel, distance=vignette.distance(fw, fh, x - fx, y - fy), **params)[:3]
+
+            def layer_progress(fraction, done=done, height=box[3]):
+                progress((done + fraction * height) / total)
+            map_pixels(layer, color, progress and layer_progress, box)
+            done += box[3]
+        return Throughput(len(plan), pixels, time.time() - start)
+
+    def jobs():
+        for layer, box, (fx, fy, fw, fh), boxes in plan:
+            src, (x0, y0) = Source(layer, box, precision), box[:2]
+            # The kernels write to a ring of strip buffers, one more than
+            # the strips that can be in flight or being written back.
+            out = bridge.Buffers(window + 1, min(strip_height, box[3]), box[2], src.channels,
+                                 "u1" if src.format.native else "f4")
+            for y, rows in boxes:
+                yield kernel, params, src.read(y - y0, rows), (fw, fh), x0 - fx, y - fy, out.take(rows)
+
+    pool = parallel.make_pool(workers) if workers > 1 else None
+    try:
+        if pool is None:
+            results = (parallel.run_tile(job) for job in jobs())
+        else:
+            results = parallel.ordered(pool, parallel.run_tile, jobs(), window)
+
+        done = 0
+        for layer, box, _, boxes in plan:
+            dst = Sink(layer, box, precision)
+            for y, rows in boxes:
+                dst.write(y - box[1], next(results))
+                done += rows
+
+                # Update the progress bar.
+                if progress is not None:
+                    progress(done / total)
+            dst.close()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return Throughput(len(plan), pixels, time.time() - start)
+
+
+class Source(object):
+    """Strips of a rectangle of a drawable as arrays, see stream.process().
+
+    box is (x, y, width, height), by default the selection bounds, and rows
+    are counted from its top. Strips are uint8 arrays for 8-bit perceptual
+    drawables and float32 arrays otherwise, see precision.Format.
+    """
+
+    def __init__(self, layer, box=None, precision=None):
+        self.x, self.y, self.width, self.height = box or bounds(layer)
+        self.format = formats.of_layer(layer, precision)
+        self.channels = self.format.channels
+        self.rgn = layer.get_pixel_rgn(self.x, self.y, self.width, self.height, False, False)
+
+    def read(self, y, rows):
+        y += self.y
+        return self.format.decode(self.rgn[self.x:self.x + self.width, y:y + rows], rows, self.width)
+
+    def close(self):
+        pass
+
+
+class Sink(object):
+    """Writes strips to the shadow buffer of a drawable, merged on close().
+
+    box is the rectangle written and precision the one of the image, as for
+    Source.
+    """
+
+    def __init__(self, layer, box=None, precision=None):
+        self.layer = layer
+        self.box = box or bounds(layer)
+        self.x, self.y, self.width, height = self.box
+        self.format = formats.of_layer(layer, precision)
+        self.rgn = layer.get_pixel_rgn(self.x, self.y, self.width, height, True, True)
+        self.encoded = None
+
+    def write(self, y, block):
+        y += self.y
+        out = None
+        if not self.format.direct:
+            # Blocks are converted one at a time into the same buffer.
+            if self.encoded is None or self.encoded.rows < block.shape[0]:
+                self.encoded = bridge.Buffers(1, block.shape[0], self.width, self.format.channels,
+                                              self.format.dtype)
+            out = self.encoded.take(block.shape[0])
+        bridge.assign(self.rgn, (slice(self.x, self.x + self.width), slice(y, y + block.shape[0])),
+                      self.format.encode(block, out))
+
+    def close(self):
+        merge(self.layer, self.box)
+
+
+def merge(layer, box=None):
+    """Merge the shadow buffer and update the rectangle in one go."""
+    layer.flush()
+    layer.merge_shadow(True)
+    layer.update(*(box or (0, 0, layer.width, layer.height)))
@@ -0,0 +1,290 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Local HTTP service running the filters, without starting GIMP per job.
+
+    POST /filters/chicago?redshift=40&format=jpeg    image file in, filtered image out
+    GET  /filters                                    filters and default parameters, JSON
+    GET  /metrics                                    latency, queue depth and counters, JSON
+
+Request bodies are read in chunks, with a Content-Length or chunked, up to a
+size limit. The images are decoded, filtered and encoded on a pool of worker
+processes started with the service, whose lookup tables of the default
+parameters are compiled up front and whose distance maps stay cached between
+requests. At most max_concurrency images are in the pool at once; requests
+beyond that wait, and are turned away with 503 when max_queue are already
+waiting. The server only uses the standard library, run it with
+
+    python -m instagimp serve --port 8080
+"""
+
+from __future__ import print_function
+
+import json
+import threading
+import time
+from collections import deque
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qsl, urlsplit
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qsl, urlsplit
+
+from . import images, kernels, parallel
+
+# Largest request body accepted, and size of the chunks it is read and sent in.
+MAX_BODY = 256 << 20
+CHUNK = 1 << 16
+
+# Requests allowed to wait for a worker before new ones are rejected.
+MAX_QUEUE = 64
+
+# Latencies kept for the percentiles of /metrics.
+WINDOW = 1024
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+def warm():
+    """Compile the tables of the default parameters of every filter."""
+    for kernel in kernels.FILTERS.values():
+        kernel.tables(**kernels.parameters(kernel))
+
+
+def process(job):
+    """Filter the bytes of an image file, job is (filter, params, data, format).
+
+    Returns the bytes of the result, in format or else the format of the
+    input, and that format. Runs in the workers.
+    """
+    name, params, data, format = job
+    pixels, source = images.decode(data)
+    format = format or source or "PNG"
+    return images.encode(kernels.FILTERS[name](pixels, **params), format), format
+
+
+class Metrics(object):
+    """Counters and recent latencies of a service, safe to share between threads."""
+
+    def __init__(self, window=WINDOW):
+        self._lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.requests = self.errors = self.rejected = 0
+        self.active = self.waiting = 0
+        self.bytes_in = self.bytes_out = 0
+        self.started = time.time()
+
+    def add(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def enqueue(self, limit):
+        """Count a request waiting for a worker, False if limit already are."""
+        with self._lock:
+            if self.waiting >= limit:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+            return True
+
+    def record(self, seconds, error=False):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.requests += 1
+            self.errors += bool(error)
+
+    def snapshot(self):
+        """Metrics as a dict, latencies in milliseconds."""
+        with self._lock:
+            latencies = sorted(self.latencies)
+            result = {"requests": self.requests, "errors": self.errors, "rejected": self.rejected,
+                      "active": self.active, "queue_depth": self.waiting,
+                      "bytes_in": self.bytes_in, "bytes_out": self.bytes_out,
+                      "uptime": time.time() - self.started}
+        if latencies:
+            at = lambda q: 1000 * latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+            result["latency_ms"] = {"mean": 1000 * sum(latencies) / len(latencies), "p50": at(0.5),
+                                    "p90": at(0.9), "p99": at(0.99), "max": 1000 * latencies[-1]}
+        return result
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if status == 503:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        for start in range(0, len(body), CHUNK):
+            self.wfile.write(body[start:start + CHUNK])
+        self.server.metrics.add(bytes_out=len(body))
+
+    def send_json(self, status, value):
+        self.send_body(status, json.dumps(value, indent=2, sort_keys=True).encode("utf-8"), "application/json")
+
+    def read_body(self):
+        """Read the request body chunk by chunk, at most server.max_body bytes."""
+        parts, size = [], 0
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                length = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if not length:
+                    # Skip the trailer up to the final empty line.
+                    while self.rfile.readline().strip():
+                        pass
+                    break
+                size += length
+                if size > self.server.max_body:
+                    raise HTTPError(413, "request body larger than %d bytes" % self.server.max_body)
+                parts.append(self.rfile.read(length))
+                self.rfile.readline()
+        else:
+            remaining = int(self.headers.get("Content-Length") or 0)
+            if remaining > self.server.max_body:
+                raise HTTPError(413, "request body larger than %d bytes" % self.server.max_body)
+            while remaining:
+                part = self.rfile.read(min(CHUNK, remaining))
+                if not part:
+                    raise HTTPError(400, "request body shorter than its Content-Length")
+                parts.append(part)
+                remaining -= len(part)
+        body = b"".join(parts)
+        self.server.metrics.add(bytes_in=len(body))
+        return body
+
+    def do_GET(self):
+        path = urlsplit(self.path).path.rstrip("/")
+        if path == "/metrics":
+            self.send_json(200, self.server.metrics.snapshot())
+        elif path in ("", "/filters"):
+            self.send_json(200, dict((name, dict(kernels.parameters(kernel)))
+                                     for name, kernel in kernels.FILTERS.items()))
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        start = time.time()
+        error = True
+        try:
+            url = urlsplit(self.path)
+            parts = url.path.strip("/").split("/")
+            if len(parts) != 2 or parts[0] != "filters":
+                raise HTTPError(404, "POST an image to /filters/<name>")
+            query = parse_qsl(url.query)
+            format = dict(query).get("format")
+            try:
+                params = kernels.parse_params(parts[1], ["%s=%s" % item for item in query if item[0] != "format"])
+            except ValueError as err:
+                raise HTTPError(404 if parts[1] not in kernels.FILTERS else 400, str(err))
+            if format is not None:
+                try:
+                    images.format_name(format)
+                except ValueError as err:
+                    raise HTTPError(400, str(err))
+            body = self.read_body()
+            if not body:
+                raise HTTPError(400, "empty request body")
+            data, format = self.server.submit((parts[1], params, body, format))
+            self.send_body(200, data, images.mime_type(format))
+            error = False
+        except HTTPError as err:
+            self.send_json(err.status, {"error": str(err)})
+            # The rest of a rejected body would be read as the next request.
+            self.close_connection = True
+        except (ValueError, IOError) as err:
+            self.send_json(400, {"error": "cannot filter the image: %s" % err})
+        except Exception as err:
+            self.send_json(500, {"error": "%s: %s" % (type(err).__name__, err)})
+        finally:
+            self.server.metrics.record(time.time() - start, error)
+
+
+class Service(ThreadingMixIn, HTTPServer):
+    """HTTP server with a warm pool of workers filtering the images.
+
+    kind is "process" or "thread", workers defaults to one per CPU and
+    max_concurrency, the images in the pool at once, to workers.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, workers=None, kind="process", max_concurrency=None, max_queue=MAX_QUEUE,
+                 max_body=MAX_BODY, verbose=False):
+        HTTPServer.__init__(self, address, Handler)
+        workers = workers or parallel.cpu_count()
+        # Thread workers share the tables and distance maps of the server process.
+        self.pool = parallel.make_pool(workers, kind, warm if kind == "process" else None)
+        if kind != "process":
+            warm()
+        self.slots = threading.BoundedSemaphore(max_concurrency or workers)
+        self.max_queue = max_queue
+        self.max_body = max_body
+        self.verbose = verbose
+        self.metrics = Metrics()
+
+    def submit(self, job):
+        """Run process(job) on the pool once a slot is free."""
+        if not self.metrics.enqueue(self.max_queue):
+            raise HTTPError(503, "too many requests waiting")
+        try:
+            self.slots.acquire()
+        finally:
+            self.metrics.add(waiting=-1)
+        self.metrics.add(active=1)
+        try:
+            return self.pool.apply_async(process, (job,)).get()
+        finally:
+            self.metrics.add(active=-1)
+            self.slots.release()
+
+    def close(self):
+        self.server_close()
+        self.pool.close()
+        self.pool.join()
+
+
+def serve(host="127.0.0.1", port=8080, **options):
+    """Run a Service until interrupted, options are those of Service."""
+    service = Service((host, port), **options)
+    print("serving the InstaGIMP filters on http://%s:%d/" % service.server_address[:2])
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
@@ -0,0 +1,403 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""Declarative description of the filters and its compiler.
+
+All filters are made of the same stages: a linear gain and offset, a
+desaturation to the channel average, a color multiply, a constant tint, a
+radial white center or black outside, and a cubic tone curve on the channel
+average. A Spec lists the parameters of a filter with their defaults and its
+stages in order, and compiles into the Tables of instagimp.luts, so that
+every filter runs as table lookups plus a vectorized vignette.
+
+Specs are plain data and can be written as JSON, see Spec.from_dict():
+
+    {"name": "ghost",
+     "params": [["alpha", 1.975], ["beta", -100], ["whiteoutside", 50]],
+     "stages": [{"stage": "desaturate"},
+                {"stage": "gain", "alpha": "alpha", "beta": "beta"},
+                {"stage": "outside", "amount": "whiteoutside"}]}
+
+Stage arguments are numbers, or parameter names, optionally negated with a
+leading "-". Stages are applied on the channels in order, the radial terms
+being functions of the normalized distance d (see instagimp.vignette):
+
+    gain(alpha, beta=0)          x -> alpha * x + beta
+    desaturate()                 every channel becomes the channel average
+    multiply(color)              channel c is scaled by color[c] / 255
+    tint(red=0, green=0, blue=0) adds a constant per channel
+    center(amount)               adds amount * (1 - d), a white center
+    outside(amount)              adds amount * d, a white or black outside
+    tone(curve, amount=1, weight=1)
+                                 adds (a*x^3 + b*x^2 + c*x + d) * amount *
+                                 weight for curve (a, b, c, d), where x is
+                                 the current channel average minus 128
+
+gain, center, outside and tone take an optional list of channels ("red",
+"green", "blue"), all three by default. This module does not need NumPy.
+"""
+
+from collections import OrderedDict
+
+from . import luts
+
+CHANNELS = ("red", "green", "blue")
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+
+class _Linear(object):
+    """a * v + b * s / 3 + terms, v the channel value and s the channel sum.
+
+    terms are numbers or functions of s, summed in order.
+    """
+
+    def __init__(self, a=0, b=0, terms=()):
+        self.a, self.b, self.terms = a, b, list(terms)
+
+    def copy(self):
+        return _Linear(self.a, self.b, self.terms)
+
+    def scale(self, factor):
+        def scaled(f):
+            return lambda s: factor * f(s)
+        terms = [scaled(t) if callable(t) else factor * t for t in self.terms]
+        return _Linear(factor * self.a, factor * self.b, terms)
+
+    def same(self, other):
+        return (self.a, self.b) == (other.a, other.b) and len(self.terms) == len(other.terms) \
+            and all(x is y or x == y for x, y in zip(self.terms, other.terms))
+
+    def constant(self):
+        """The value as a number, or None when it depends on v or s."""
+        if self.a or self.b or any(callable(t) for t in self.terms):
+            return None
+        total = 0
+        for i, t in enumerate(self.terms):
+            total = t if i == 0 else total + t
+        return total
+
+    def of_sum(self, constants=True):
+        """The s dependent part as a function of s, or None without one.
+
+        The constants are included in the sum unless constants is False.
+        """
+        terms = [t for t in self.terms if constants or callable(t)]
+        if not self.b and not terms:
+            return None
+        b = self.b
+
+        def f(s):
+            acc = b * s / 3.0 if b else s * 0.0
+            for t in terms:
+                acc = acc + (t(s) if callable(t) else t)
+            return acc
+        return f
+
+    def of_value(self):
+        """a * v plus the constant terms, as a function of v."""
+        a, terms = self.a, [t for t in self.terms if not callable(t)]
+
+        def f(v):
+            acc = a * v
+            for t in terms:
+                acc = acc + t
+            return acc
+        return f
+
+
+def _average(lins):
+    """Average of three _Linear terms of the channels."""
+    if lins[0].same(lins[1]) and lins[0].same(lins[2]):
+        return _Linear(0, lins[0].a + lins[0].b, lins[0].terms)
+    if not lins[0].a == lins[1].a == lins[2].a:
+        raise ValueError("cannot average channels with different gains")
+    b = lins[0].a + (lins[0].b + lins[1].b + lins[2].b) / 3.0
+    constant = sum(t for lin in lins for t in lin.terms if not callable(t)) / 3.0
+    functions = [t for lin in lins for t in lin.terms if callable(t)]
+    terms = [constant]
+    if functions:
+        terms.append(lambda s: sum(f(s) for f in functions) / 3.0)
+    return _Linear(0, b, terms)
+
+
+class _Channels(object):
+    """Each channel as powers of d: [d^0, d^1, d^2] _Linear terms."""
+
+    def __init__(self):
+        self.channels = [[_Linear(a=1), _Linear(), _Linear()] for _ in range(3)]
+
+    def average(self):
+        return [_average([channel[k] for channel in self.channels]) for k in range(3)]
+
+
+def _channels(names):
+    if names is None:
+        return range(3)
+    if isinstance(names, string_types):
+        names = [names]
+    for name in names:
+        if name not in CHANNELS:
+            raise ValueError("unknown channel %r, expected one of %s" % (name, ", ".join(CHANNELS)))
+    return [CHANNELS.index(name) for name in names]
+
+
+def _gain(state, alpha, beta=0, channels=None):
+    for c in _channels(channels):
+        channel = state.channels[c] = [lin.scale(alpha) for lin in state.channels[c]]
+        channel[0].terms.append(beta)
+
+
+def _desaturate(state):
+    average = state.average()
+    state.channels = [[lin.copy() for lin in average] for _ in range(3)]
+
+
+def _multiply(state, color):
+    for c in range(3):
+        state.channels[c] = [lin.scale(float(color[c]) / 255.0) for lin in state.channels[c]]
+
+
+def _tint(state, red=0, green=0, blue=0):
+    for c, amount in enumerate((red, green, blue)):
+        if amount:
+            state.channels[c][0].terms.append(amount)
+
+
+def _center(state, amount, channels=None):
+    for c in _channels(channels):
+        state.channels[c][0].terms.append(amount)
+        state.channels[c][1].terms.append(-amount)
+
+
+def _outside(state, amount, channels=None):
+    for c in _channels(channels):
+        state.channels[c][1].terms.append(amount)
+
+
+def _tone(state, curve, amount=1, weight=1, channels=None):
+    # The average is x0(s) + x1 * d + x2 * d * d around 128, the curve is
+    # expanded in powers of d, which the tables hold up to d * d.
+    a, b, c, d = curve
+    average = state.average()
+    x0 = average[0].of_sum()
+    x1, x2 = average[1].constant(), average[2].constant()
+    if x1 is None or x2 is None:
+        raise ValueError("tone curves need an average whose radial terms are constant")
+    if (x1 or x2) and (a or x2):
+        raise ValueError("tone curves on a vignetted average must be quadratic")
+    k = amount * weight
+
+    def at_center(s):
+        x = x0(s) - 128
+        return (a * x * x * x + b * x * x + c * x + d) * k
+
+    def linear(s):
+        x = x0(s) - 128
+        return (2.0 * b * x + c) * x1 * k
+
+    for channel in _channels(channels):
+        state.channels[channel][0].terms.append(at_center)
+        if x1:
+            state.channels[channel][1].terms.append(linear)
+            state.channels[channel][2].terms.append(b * x1 * x1 * k)
+
+
+# Stages by name.
+STAGES = OrderedDict([
+    ("gain", _gain),
+    ("desaturate", _desaturate),
+    ("multiply", _multiply),
+    ("tint", _tint),
+    ("center", _center),
+    ("outside", _outside),
+    ("tone", _tone),
+])
+
+
+def _freeze(value):
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def _resolve(value, params):
+    """Value of a stage argument, parameter names are looked up in params."""
+    if isinstance(value, (list, tuple)):
+        return type(value)(_resolve(v, params) for v in value)
+    if not isinstance(value, string_types):
+        return value
+    name, sign = (value[1:], -1) if value.startswith("-") else (value, 1)
+    if name not in params:
+        raise ValueError("unknown parameter %r, expected one of %s" % (name, ", ".join(params)))
+    return -params[name] if sign < 0 else params[name]
+
+
+def compile(spec, params):
+    """Compile spec for a complete parameter set into luts.Tables."""
+    state = _Channels()
+    for stage in spec.stages:
+        args = dict((key, _resolve(value, params) if key != "channels" else value)
+                    for key, value in stage.items() if key != "stage")
+        if stage["stage"] not in STAGES:
+            raise ValueError("unknown stage %r, expected one of %s" % (stage["stage"], ", ".join(STAGES)))
+        STAGES[stage["stage"]](state, **args)
+
+    value, total, slope, curve = [], [], [], []
+    for c, (lin0, lin1, lin2) in enumerate(state.channels):
+        if lin1.a or lin2.a or lin2.b or lin2.constant() is None:
+            raise ValueError("%s: radial terms can only depend on the channel sum" % CHANNELS[c])
+        # The constants go with the channel value when there is one.
+        if lin0.a:
+            value.append(lin0.of_value())
+            total.append(lin0.of_sum(constants=False))
+        else:
+            value.append(None)
+            total.append(lin0.of_sum())
+        constant = lin1.constant()
+        slope.append(lin1.of_sum() if constant is None else constant)
+        curve.append(lin2.constant())
+    return luts.Tables(value, total, slope, curve)
+
+
+class Spec(object):
+    """A filter as a list of stages.
+
+    params is a list of (name, default) pairs, in the order of the plug-in
+    register block, stages a list of dicts with the stage name under "stage"
+    and its arguments.
+    """
+
+    def __init__(self, name, params, stages, doc=None):
+        self.name = name
+        self.params = OrderedDict(params)
+        self.stages = [dict(stage) for stage in stages]
+        self.doc = doc
+
+    @classmethod
+    def from_dict(cls, data):
+        """Spec from a dict, e.g. loaded from JSON."""
+        return cls(data["name"], [tuple(param) for param in data["params"]], data["stages"], data.get("doc"))
+
+    def to_dict(self):
+        data = OrderedDict([("name", self.name), ("params", [list(item) for item in self.params.items()]),
+                            ("stages", self.stages)])
+        if self.doc:
+            data["doc"] = self.doc
+        return data
+
+    def __repr__(self):
+        return "Spec(%r)" % self.name
+
+    def tables(self, *args, **kwargs):
+        """Compiled Tables for a parameter set, missing ones take their defaults.
+
+        Tables are cached per parameter set.
+        """
+        params = OrderedDict(self.params)
+        params.update(zip(self.params, args))
+        for key, value in kwargs.items():
+            if key not in params:
+                raise TypeError("%s got an unexpected parameter %r" % (self.name, key))
+            params[key] = value
+
+        key = (self.name,) + tuple(_freeze(value) for value in params.values())
+        tables = luts.cache.get(key)
+        if tables is None:
+            tables = compile(self, params)
+            luts.cache.put(key, tables)
+        return tables
+
+
+# The InstaGIMP filters, in menu order.
+
+ANDROMEDA = Spec(
+    "andromeda",
+    [("alpha", 1.475), ("beta", -20), ("whitecenter", 40), ("blackoutside", 80), ("redint", 10),
+     ("greenint", 50), ("bluize", 60), ("greenoutside", 50)],
+    [{"stage": "gain", "alpha": "alpha", "beta": "beta"},
+     {"stage": "center", "amount": "whitecenter"},
+     {"stage": "outside", "amount": "-blackoutside"},
+     {"stage": "tint", "red": "-redint", "green": "greenint"},
+     {"stage": "tone", "curve": (0, 0.00006, 0, 0), "amount": "bluize", "channels": ["blue"]},
+     {"stage": "outside", "amount": "greenoutside", "channels": ["green"]}],
+    "Andromeda: contrast, white center, yellow tint and blue on the mid-tones.")
+
+CHICAGO = Spec(
+    "chicago",
+    [("whiteoutside", 120), ("sepiacolor", (214, 240, 201)), ("redshift", 34)],
+    [{"stage": "desaturate"},
+     {"stage": "multiply", "color": "sepiacolor"},
+     {"stage": "tint", "red": "redshift"},
+     {"stage": "outside", "amount": "whiteoutside"}],
+    "Chicago: sepia toned average with a white outside.")
+
+GENEVA = Spec(
+    "geneva",
+    [("alpha", 1.775), ("beta", -40), ("brownfusion", 25), ("blackoutside", 100)],
+    [{"stage": "desaturate"},
+     {"stage": "gain", "alpha": "alpha", "beta": "beta"},
+     {"stage": "tint", "blue": "brownfusion"},
+     {"stage": "outside", "amount": "-blackoutside"}],
+    "Geneva: contrasted brown monochrome with a black outside.")
+
+GHOST = Spec(
+    "ghost",
+    [("alpha", 1.975), ("beta", -100), ("whiteoutside", 50)],
+    [{"stage": "desaturate"},
+     {"stage": "gain", "alpha": "alpha", "beta": "beta"},
+     {"stage": "outside", "amount": "whiteoutside"}],
+    "Ghost: contrasted black and white with a white outside.")
+
+SANFRANCISCO = Spec(
+    "sanfrancisco",
+    [("alpha", 1.375), ("beta", -85), ("whitecenter", 40), ("blackoutside", 134), ("redint", 115),
+     ("greenize", 80)],
+    [{"stage": "gain", "alpha": "alpha", "beta": "beta"},
+     {"stage": "center", "amount": "whitecenter"},
+     {"stage": "outside", "amount": "-blackoutside"},
+     {"stage": "tint", "red": "redint", "green": "greenize"}],
+    "San Francisco: contrast, vignette and a red and green tint.")
+
+SIXITIES = Spec(
+    "sixities",
+    [("alpha", 1.175), ("beta", -30), ("blackoutside", 60), ("whitecenter", 60), ("redint", 115)],
+    [{"stage": "gain", "alpha": "alpha", "beta": "beta"},
+     {"stage": "tone", "curve": (0, 0.00005, 0, 0.5), "amount": "redint", "weight": 0.5, "channels": ["red"]},
+     {"stage": "center", "amount": "whitecenter"},
+     {"stage": "outside", "amount": "-blackoutside"},
+     {"stage": "tint", "red": 10, "green": 13}],
+    "Sixities: contrast, vignette and red on the extreme tones.")
+
+SUNNYDAY = Spec(
+    "sunnyday",
+    [("alpha", 1.575), ("beta", -50), ("blackoutside", 80), ("redcenter", 100), ("redint", 50)],
+    [{"stage": "gain", "alpha": "alpha", "beta": "beta"},
+     {"stage": "tone", "curve": (0, 0.00006, 0, 1), "amount": "redint", "weight": 0.5,
+      "channels": ["red", "green"]},
+     {"stage": "center", "amount": "redcenter", "channels": ["red"]},
+     {"stage": "outside", "amount": "-blackoutside"}],
+    "Sunnyday: contrast, red center and warm extreme tones.")
+
+# Specs by filter name, in menu order.
+SPECS = OrderedDict((spec.name, spec) for spec in
+                    (ANDROMEDA, CHICAGO, GENEVA, GHOST, SANFRANCISCO, SIXITIES, SUNNYDAY))
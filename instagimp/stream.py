@@ -0,0 +1,313 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Streaming strip-based filtering with bounded memory.
+
+Huge images are filtered one horizontal strip at a time: a source yields the
+rows of a strip, the kernel filters them with the strip's window of the
+distance map, and a sink writes them straight to the output. The strip height
+follows from a memory budget, so peak memory does not depend on the height
+of the image.
+
+Sources and sinks are the GIMP drawable (see regions.Source and regions.Sink)
+and uncompressed files which are memory-mapped: binary PPM/PAM, baseline TIFF
+and raw interleaved bytes. Other formats are decoded whole with Pillow, which
+bounds the working set but not the decoded input.
+"""
+
+import os
+import struct
+
+from . import images, parallel, vignette
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Rough peak working set of a kernel per pixel of a strip: the uint8 input and
+# output plus a handful of float64 temporaries for the distance and lookups.
+BYTES_PER_PIXEL = 64
+
+# Default memory budget of the strips in flight.
+MAX_BYTES = 64 << 20
+
+
+def strip_rows(width, max_bytes=MAX_BYTES, strips=1):
+    """Rows per strip so that strips strips of width pixels fit in max_bytes."""
+    return max(1, int(max_bytes // (strips * width * BYTES_PER_PIXEL)))
+
+
+class ArraySource(object):
+    """Strips of an image already held as an HxWxC array."""
+
+    def __init__(self, pixels):
+        self.pixels = pixels
+        self.height, self.width, self.channels = pixels.shape
+
+    def read(self, y, rows):
+        return self.pixels[y:y + rows]
+
+    def close(self):
+        pass
+
+
+class MappedSink(object):
+    """Writes strips to a memory-mapped HxWxC uint8 array."""
+
+    def __init__(self, pixels):
+        self.pixels = pixels
+
+    def write(self, y, block):
+        self.pixels[y:y + block.shape[0]] = block
+
+    def close(self):
+        self.pixels.flush()
+        del self.pixels
+
+
+# Binary PPM and PAM
+
+def _read_token(f):
+    token = b""
+    while True:
+        c = f.read(1)
+        if not c:
+            return token
+        if c == b"#":
+            f.readline()
+            continue
+        if c.isspace():
+            if token:
+                return token
+            continue
+        token += c
+
+
+def read_pnm_header(path):
+    """Return (width, height, channels, data offset) of a P6 or P7 file."""
+    with open(path, "rb") as f:
+        magic = f.read(2)
+        if magic == b"P6":
+            width, height, maxval = int(_read_token(f)), int(_read_token(f)), int(_read_token(f))
+            channels = 3
+        elif magic == b"P7":
+            fields = {}
+            f.readline()
+            while True:
+                line = f.readline().split(b"#")[0].split()
+                if not line:
+                    continue
+                if line[0] == b"ENDHDR":
+                    break
+                fields[line[0]] = line[1]
+            width, height = int(fields[b"WIDTH"]), int(fields[b"HEIGHT"])
+            channels, maxval = int(fields[b"DEPTH"]), int(fields[b"MAXVAL"])
+        else:
+            raise ValueError("%s: not a binary PPM or PAM file" % path)
+        if maxval != 255 or channels not in (3, 4):
+            raise ValueError("%s: only 8-bit RGB and RGBA files can be streamed" % path)
+        return width, height, channels, f.tell()
+
+
+def write_pnm_header(f, width, height, channels):
+    """Write a P6 or P7 header, returns the offset of the pixel data."""
+    if channels == 3:
+        f.write(("P6\n%d %d\n255\n" % (width, height)).encode("ascii"))
+    else:
+        f.write(("P7\nWIDTH %d\nHEIGHT %d\nDEPTH 4\nMAXVAL 255\nTUPLTYPE RGB_ALPHA\nENDHDR\n"
+                 % (width, height)).encode("ascii"))
+    return f.tell()
+
+
+# Baseline TIFF, uncompressed and interleaved
+
+_SHORT, _LONG = 3, 4
+
+
+def read_tiff_header(path):
+    """Return (width, height, channels, data offset) of a TIFF file.
+
+    Only uncompressed, interleaved 8-bit RGB(A) files whose strips are stored
+    contiguously can be mapped, which is what TiffSink writes.
+    """
+    with open(path, "rb") as f:
+        order = f.read(2)
+        if order not in (b"II", b"MM"):
+            raise ValueError("%s: not a TIFF file" % path)
+        e = "<" if order == b"II" else ">"
+        magic, offset = struct.unpack(e + "HI", f.read(6))
+        f.seek(offset)
+        count, = struct.unpack(e + "H", f.read(2))
+        tags = {}
+        for _ in range(count):
+            tag, kind, n, value = struct.unpack(e + "HHI4s", f.read(12))
+            size = {_SHORT: 2, _LONG: 4}.get(kind)
+            if size is None:
+                continue
+            fmt = e + ("H" if kind == _SHORT else "I") * n
+            if n * size <= 4:
+                tags[tag] = struct.unpack(fmt, value[:n * size])
+            else:
+                here = f.tell()
+                f.seek(struct.unpack(e + "I", value)[0])
+                tags[tag] = struct.unpack(fmt, f.read(n * size))
+                f.seek(here)
+
+    width, height = tags[256][0], tags[257][0]
+    channels = tags.get(277, (1,))[0]
+    offsets, counts = tags[273], tags[279]
+    contiguous = all(offsets[i] + counts[i] == offsets[i + 1] for i in range(len(offsets) - 1))
+    if (tags.get(259, (1,))[0] != 1 or tags.get(284, (1,))[0] != 1 or set(tags.get(258, (1,))) != {8}
+            or channels not in (3, 4) or not contiguous):
+        raise ValueError("%s: only uncompressed, contiguous 8-bit RGB(A) TIFF files can be streamed" % path)
+    return width, height, channels, offsets[0]
+
+
+def write_tiff_header(f, width, height, channels):
+    """Write a little-endian baseline TIFF header with one strip of data.
+
+    Returns the offset at which the pixel data must be written.
+    """
+    size = width * height * channels
+    if size >= 1 << 32:
+        raise ValueError("images of 4 GB or more do not fit in a baseline TIFF file")
+    entries = [
+        (256, _LONG, 1, width),
+        (257, _LONG, 1, height),
+        (258, _SHORT, channels, None),
+        (259, _SHORT, 1, 1),
+        (262, _SHORT, 1, 2),
+        (273, _LONG, 1, None),
+        (277, _SHORT, 1, channels),
+        (278, _LONG, 1, height),
+        (279, _LONG, 1, size),
+        (284, _SHORT, 1, 1),
+    ]
+    if channels == 4:
+        # Unassociated alpha
+        entries.append((338, _SHORT, 1, 2))
+
+    ifd_size = 2 + 12 * len(entries) + 4
+    bps_offset = 8 + ifd_size
+    data_offset = bps_offset + 2 * channels
+    data_offset += -data_offset % 16
+
+    f.write(struct.pack("<2sHI", b"II", 42, 8))
+    f.write(struct.pack("<H", len(entries)))
+    for tag, kind, count, value in entries:
+        if tag == 258:
+            value = bps_offset
+        elif tag == 273:
+            value = data_offset
+        if kind == _SHORT and count == 1:
+            f.write(struct.pack("<HHIHH", tag, kind, count, value, 0))
+        else:
+            f.write(struct.pack("<HHII", tag, kind, count, value))
+    f.write(struct.pack("<I", 0))
+    f.write(struct.pack("<%dH" % channels, *([8] * channels)))
+    f.write(b"\0" * (data_offset - f.tell()))
+    return data_offset
+
+
+_HEADERS = {
+    ".ppm": (read_pnm_header, write_pnm_header),
+    ".pnm": (read_pnm_header, write_pnm_header),
+    ".pam": (read_pnm_header, write_pnm_header),
+    ".tif": (read_tiff_header, write_tiff_header),
+    ".tiff": (read_tiff_header, write_tiff_header),
+}
+
+
+def _extension(path):
+    return os.path.splitext(path)[1].lower()
+
+
+def can_write(path):
+    """Whether sink() can stream to path."""
+    return _extension(path) in _HEADERS or _extension(path) == ".raw"
+
+
+def source(path, shape=None):
+    """Open path for streaming.
+
+    PPM/PAM and TIFF files are memory-mapped, raw files need their
+    (height, width, channels) shape. Anything else is decoded with Pillow.
+    """
+    ext = _extension(path)
+    if ext == ".raw":
+        if shape is None:
+            raise ValueError("%s: raw files need their height, width and channels" % path)
+        return ArraySource(np.memmap(path, dtype=np.uint8, mode="r", shape=tuple(shape)))
+    if ext in _HEADERS:
+        width, height, channels, offset = _HEADERS[ext][0](path)
+        return ArraySource(np.memmap(path, dtype=np.uint8, mode="r", offset=offset,
+                                     shape=(height, width, channels)))
+    return ArraySource(images.load(path))
+
+
+def sink(path, width, height, channels):
+    """Create path as a memory-mapped PPM/PAM, TIFF or raw file."""
+    ext = _extension(path)
+    if ext != ".raw" and ext not in _HEADERS:
+        raise ValueError("%s: can only stream to .ppm, .pam, .tif or .raw files" % path)
+    with open(path, "wb") as f:
+        offset = 0 if ext == ".raw" else _HEADERS[ext][1](f, width, height, channels)
+        f.truncate(offset + width * height * channels)
+    return MappedSink(np.memmap(path, dtype=np.uint8, mode="r+", offset=offset,
+                                shape=(height, width, channels)))
+
+
+def _run_strip(job):
+    # Strips compute their distances directly, a cached quadrant of a huge
+    # frame would not fit in the budget.
+    kernel, params, block, frame, y = job
+    distance = vignette.compute(frame[0], frame[1], 0, y, frame[0], block.shape[0])
+    return kernel(np.asarray(block), distance=distance, **params)
+
+
+def process(src, dst, kernel, params, max_bytes=MAX_BYTES, workers=1, progress=None):
+    """Filter src into dst strip by strip within about max_bytes of memory.
+
+    src needs width, height and read(y, rows), dst needs write(y, block).
+    With several workers, strips are filtered on a thread pool and the budget
+    is shared by the strips in flight.
+    """
+    width, height = src.width, src.height
+    window = 2 * workers if workers > 1 else 1
+    rows = strip_rows(width, max_bytes, window)
+    boxes = [(y, min(rows, height - y)) for y in range(0, height, rows)]
+    jobs = ((kernel, params, src.read(y, n), (width, height), y) for y, n in boxes)
+
+    pool = parallel.make_pool(workers) if workers > 1 else None
+    try:
+        if pool is None:
+            results = (_run_strip(job) for job in jobs)
+        else:
+            results = parallel.ordered(pool, _run_strip, jobs, window)
+        for i, block in enumerate(results):
+            y, n = boxes[i]
+            dst.write(y, block)
+            if progress is not None:
+                progress(float(y + n) / float(height))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
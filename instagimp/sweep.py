@@ -0,0 +1,141 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Parameter sweeps rendered from one decoded image.
+
+Picking a look means comparing a filter over a grid of parameter values. A
+Sweep decodes the image once and renders the variants of a filter through
+an incremental.Render, which keeps what the parameters swept do not change:
+the distance map, the channel sums and the color stage. Sweeping a vignette
+parameter then only costs its radial term per variant, and the tables of a
+parameter set are cached by instagimp.spec. The variants are written as a
+labelled contact sheet or as one file each.
+"""
+
+import itertools
+
+from . import incremental, kernels, vignette
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    Image = None
+
+# Height of the label under each tile of a contact sheet, and the gap around tiles.
+LABEL_HEIGHT = 14
+MARGIN = 4
+
+
+def parse(text):
+    """Parse "filter name=v1/v2 ..." into the list of its (filter, params).
+
+    Values separated by slashes are swept, the variants are all the
+    combinations of the values, the last parameter varying fastest.
+    """
+    words = text.split()
+    if not words:
+        raise ValueError("empty sweep")
+    name, names, choices = words[0], [], []
+    for word in words[1:]:
+        key, sep, values = word.partition("=")
+        if not sep:
+            raise ValueError("expected name=value[/value...], got %r" % word)
+        names.append(key)
+        choices.append(values.split("/"))
+    return [(name, kernels.parse_params(name, ["%s=%s" % item for item in zip(names, combination)]))
+            for combination in itertools.product(*choices)]
+
+
+def format_value(value):
+    if isinstance(value, tuple):
+        return ",".join(format_value(x) for x in value)
+    return "%g" % value
+
+
+def label(name, params):
+    """Name of a variant: the filter and its parameters that are not the defaults."""
+    defaults = kernels.parameters(kernels.FILTERS[name])
+    changed = ["%s=%s" % (key, format_value(value)) for key, value in params.items() if defaults[key] != value]
+    return " ".join([name] + changed)
+
+
+class Sweep(object):
+    """One image filtered with many filters and parameter sets.
+
+    distance defaults to the distance map of pixels as a whole frame, pass
+    the one of a preview proxy to sweep over a downscaled image.
+    """
+
+    def __init__(self, pixels, distance=None):
+        self.pixels = pixels
+        if distance is None:
+            distance = vignette.window(pixels.shape[1], pixels.shape[0])
+        self.distance = distance
+        # Render of the last filter, sweeps vary the parameters of one.
+        self.last = None
+
+    def render(self, kernel, params):
+        """pixels filtered by kernel, a name or a kernel, with params."""
+        if not callable(kernel):
+            kernel = kernels.FILTERS[kernel]
+        if self.last is None or self.last.kernel is not kernel:
+            self.last = incremental.Render(self.pixels, kernel, self.distance)
+        return self.last(**params)
+
+    def __call__(self, variants):
+        """Yield the rendering of each (filter, params) of variants."""
+        for kernel, params in variants:
+            yield self.render(kernel, params)
+
+
+def contact_sheet(tiles, labels, columns=None, background=255):
+    """Lay out same-size HxWxC tiles in a grid, each above its label.
+
+    Returns the sheet as an array, columns defaults to a roughly square grid.
+    """
+    if Image is None:
+        raise RuntimeError("contact sheets need Pillow")
+    count = len(tiles)
+    columns = columns or int(np.ceil(np.sqrt(count)))
+    rows = -(-count // columns)
+    height, width, channels = tiles[0].shape
+    cell_w, cell_h = width + MARGIN, height + LABEL_HEIGHT + MARGIN
+
+    sheet = np.empty((rows * cell_h + MARGIN, columns * cell_w + MARGIN, channels), dtype=np.uint8)
+    sheet[...] = background
+    if channels == 4:
+        sheet[..., 3] = 255
+    for i, tile in enumerate(tiles):
+        y, x = MARGIN + (i // columns) * cell_h, MARGIN + (i % columns) * cell_w
+        sheet[y:y + height, x:x + width] = tile
+
+    image = Image.fromarray(sheet)
+    draw = ImageDraw.Draw(image)
+    fill = (0,) * (channels - 1) + (255,) if channels == 4 else (0,) * channels
+    for i, text in enumerate(labels):
+        y, x = MARGIN + (i // columns) * cell_h + height, MARGIN + (i % columns) * cell_w
+        # The default font is 6 pixels wide, cut what would overflow the tile.
+        draw.text((x, y + 1), text[:width // 6], fill=fill)
+    return np.asarray(image)
@@ -0,0 +1,112 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""Normalized radial distance maps shared by all filters.
+
+Every filter darkens or lightens the image with the distance of a pixel to
+the frame center divided by the frame diagonal dmax. The map only depends on
+the frame size, so it is built once per (width, height) and kept in a small
+LRU cache bounded in bytes. Since |x - width / 2| is symmetric, only one
+quadrant is computed and stored, windows of the full map are gathered from
+it. Frames whose quadrant would exceed CACHE_LIMIT entries get their windows
+computed on the fly instead, so that streaming huge images keeps a bounded
+footprint.
+"""
+
+import math
+
+from .cache import LRUCache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Quadrants of the most recently used frame sizes, 256 MB at most.
+cache = LRUCache(maxsize=8, max_bytes=1 << 28)
+
+# Largest quadrant kept in the cache, in entries (128 MB of float64).
+CACHE_LIMIT = 1 << 24
+
+
+def distance(width, height, x, y):
+    """Normalized distance of pixel (x, y) to the center of the frame."""
+    dmax = math.sqrt(width * width + height * height)
+    dx = x - width / 2.0
+    dy = y - height / 2.0
+    return math.sqrt(dx * dx + dy * dy) / dmax
+
+
+def quadrant(width, height):
+    """Return the cached quadrant of the distance map of a frame.
+
+    Entry [j, i] is the distance for the pixels with floor(|x - width / 2|)
+    equal to i and floor(|y - height / 2|) equal to j. The array is read-only.
+    """
+    key = (width, height)
+    q = cache.get(key)
+    if q is None:
+        dmax = math.sqrt(width * width + height * height)
+        dx = np.arange(width // 2 + 1, dtype=np.float64) + (width % 2) / 2.0
+        dy = np.arange(height // 2 + 1, dtype=np.float64) + (height % 2) / 2.0
+        q = np.sqrt(dx[np.newaxis, :] ** 2 + dy[:, np.newaxis] ** 2) / dmax
+        q.flags.writeable = False
+        cache.put(key, q)
+    return q
+
+
+def _fold(start, count, size):
+    """Quadrant indices of count rows or columns from start."""
+    return np.floor(np.abs(np.arange(start, start + count) - size / 2.0)).astype(np.intp)
+
+
+def compute(width, height, x, y, w, h):
+    """Compute the distances of a window directly, without the cache."""
+    dmax = math.sqrt(width * width + height * height)
+    dx = np.arange(x, x + w, dtype=np.float64) - width / 2.0
+    dy = np.arange(y, y + h, dtype=np.float64) - height / 2.0
+    return np.sqrt(dx[np.newaxis, :] ** 2 + dy[:, np.newaxis] ** 2) / dmax
+
+
+def grid(width, height, xs, ys):
+    """Distances at columns xs and rows ys of a width x height frame.
+
+    The coordinates are in pixels of the full frame and need not be integers,
+    so a downscaled proxy gets the vignette of the frame it stands for.
+    """
+    dmax = math.sqrt(width * width + height * height)
+    dx = np.asarray(xs, dtype=np.float64) - width / 2.0
+    dy = np.asarray(ys, dtype=np.float64) - height / 2.0
+    return np.sqrt(dx[np.newaxis, :] ** 2 + dy[:, np.newaxis] ** 2) / dmax
+
+
+def window(width, height, x=0, y=0, w=None, h=None):
+    """Distances of the w x h window at (x, y) of a width x height frame."""
+    if w is None:
+        w = width - x
+    if h is None:
+        h = height - y
+    # Windows reaching out of the frame, such as layers sticking out of the
+    # image canvas, are not covered by the quadrant.
+    outside = x < 0 or y < 0 or x + w > width or y + h > height
+    if outside or (width // 2 + 1) * (height // 2 + 1) > CACHE_LIMIT:
+        return compute(width, height, x, y, w, h)
+    q = quadrant(width, height)
+    return q[_fold(y, h, height)[:, np.newaxis], _fold(x, w, width)[np.newaxis, :]]
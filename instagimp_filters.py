@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# All the InstaGIMP procedures, registered by a single plug-in file so that
+# GIMP starts one process to query them. The filters, and NumPy with them,
+# are only imported when a procedure runs: a query only needs gimpfu.
+
+from gimpfu import *
+import sys
+
+# Looks: (name, title, help, date, params). The params are those of the
+# kernel of the same name in instagimp.kernels, in order.
+LOOKS = [
+    ("andromeda", "Andromeda", "Black and white style GIMP filter", "2016", [
+        (PF_FLOAT, "alpha", "Alpha", 1.475),
+        (PF_SLIDER, "beta", "Beta", -20, (-255, 255, 1)),
+        (PF_SLIDER, "whitecenter", "White intensity", 40, (0, 255, 1)),
+        (PF_SLIDER, "blackoutside", "Black intensity", 80, (0, 255, 1)),
+        (PF_SLIDER, "redint", "Red", 10, (0, 255, 1)),
+        (PF_SLIDER, "greenint", "Green", 50, (0, 255, 1)),
+        (PF_SLIDER, "bluize", "Blue intensity", 60, (0, 255, 1)),
+        (PF_SLIDER, "greenoutside", "Green intensity", 50, (0, 255, 1))
+    ]),
+    ("chicago", "Chicago", "20s style GIMP filter", "2013", [
+        (PF_SLIDER, "whiteoutside", "White intensity", 120, (0, 255, 1)),
+        (PF_COLOR, "sepiacolor", "Color", (214.0/255, 240.0/255, 201.0/255)),
+        (PF_SLIDER, "redshift", "Red shift", 34, (0, 255, 1))
+    ]),
+    ("geneva", "Geneva", "20s style GIMP filter", "2013", [
+        (PF_FLOAT, "alpha", "Alpha", 1.775),
+        (PF_SLIDER, "beta", "Beta", -40, (-255, 255, 1)),
+        (PF_SLIDER, "brownfusion", "Brown fusion", 25, (0, 255, 1)),
+        (PF_SLIDER, "blackoutside", "Black intensity", 100, (0, 255, 1))
+    ]),
+    ("ghost", "Ghost", "Black and white style GIMP filter", "2016", [
+        (PF_FLOAT, "alpha", "Alpha", 1.975),
+        (PF_SLIDER, "beta", "Beta", -100, (-255, 255, 1)),
+        (PF_SLIDER, "whiteoutside", "White intensity", 50, (0, 255, 1))
+    ]),
+    ("sanfrancisco", "SanFrancisco", "Sanfrancisco style GIMP filter", "2016", [
+        (PF_FLOAT, "alpha", "Alpha", 1.375),
+        (PF_SLIDER, "beta", "Beta", -85, (-255, 255, 1)),
+        (PF_SLIDER, "whitecenter", "White intensity", 40, (0, 255, 1)),
+        (PF_SLIDER, "blackoutside", "Black intensity", 134, (0, 255, 1)),
+        (PF_SLIDER, "redint", "Reddize", 115, (0, 255, 1)),
+        (PF_SLIDER, "greenint", "Greenize", 80, (0, 255, 1))
+    ]),
+    ("sixities", "Sixities", "60s style GIMP filter", "2016", [
+        (PF_FLOAT, "alpha", "Alpha", 1.175),
+        (PF_SLIDER, "beta", "Beta", -30, (-255, 255, 1)),
+        (PF_SLIDER, "blackoutside", "Black intensity", 60, (0, 255, 1)),
+        (PF_SLIDER, "whitecenter", "White intensity", 60, (0, 255, 1)),
+        (PF_SLIDER, "redint", "Reddize", 115, (0, 255, 1))
+    ]),
+    ("sunnyday", "Sunnyday", "Sunny style GIMP filter", "2016", [
+        (PF_FLOAT, "alpha", "Alpha", 1.575),
+        (PF_SLIDER, "beta", "Beta", -50, (-255, 255, 1)),
+        (PF_SLIDER, "blackoutside", "Black intensity", 80, (0, 255, 1)),
+        (PF_SLIDER, "redcenter", "Red intensity", 100, (0, 255, 1)),
+        (PF_SLIDER, "redint", "Reddize", 50, (0, 255, 1))
+    ]),
+]
+
+# Dialog parameters registered under another name than the kernel's.
+RENAMED = {("sanfrancisco", "greenint"): "greenize"}
+
+TARGETS = (PF_OPTION, "targets", "Apply to", 0, ["Visible layers", "All open images"])
+
+# Where the vignette is centered, the options of the center parameter in
+# the order of instagimp.regions.CENTERS.
+CENTERS = ["layer", "selection", "image"]
+
+
+def center_option(default):
+    """The center parameter of a procedure, default being one of CENTERS."""
+    return (PF_OPTION, "center", "Vignette centered on", CENTERS.index(default), ["Layer", "Selection", "Image"])
+
+
+# Backends of the looks, the options of the backend parameter in order.
+BACKENDS = ["reference", "native"]
+
+# Largest difference between the native backend and the reference one with
+# the default parameters, in 8-bit levels, see instagimp.native.error_bound().
+NATIVE_ERRORS = {"andromeda": 88, "chicago": 2, "geneva": 50, "ghost": 25, "sanfrancisco": 87, "sixities": 60,
+                 "sunnyday": 90}
+
+
+def backend_option(name):
+    """The backend parameter of the procedures of look name, telling how far
+    the native backend is from the filter."""
+    return (PF_OPTION, "backend", "Run as", 0,
+            ["Python pixel math (exact)",
+             "GIMP curves and layers (approximate, up to %d levels off)" % NATIVE_ERRORS[name]])
+
+
+def look_kernel(name, params):
+    """Kernel and params of a look from the arguments of its procedure."""
+    def kernel(args):
+        from instagimp import kernels
+        values = {}
+        for param, value in zip(params, args):
+            if param[0] == PF_COLOR:
+                value = (value[0], value[1], value[2])
+            values[RENAMED.get((name, param[1]), param[1])] = value
+        return kernels.FILTERS[name], values
+    return kernel
+
+
+def pipeline_kernel(args):
+    """Kernel of the looks of the pipeline procedure, e.g. "geneva; andromeda whitecenter=20"."""
+    from instagimp import pipeline
+    return pipeline.parse(args[0]), {}
+
+
+def filter_layers(layers, kernel, params, center, backend="reference"):
+    """Filter layers with backend, one of BACKENDS, returns the throughput."""
+    from instagimp import native, regions
+    if backend == "native":
+        return native.apply_layers(pdb, layers, kernel, params, center)
+    return regions.apply_frames(layers, kernel, params, progress=gimp.progress_update, center=center)
+
+
+def run(images, message, body):
+    """Run body() in an undo group on each image, reporting its errors."""
+    # Indicates that the process has started.
+    gimp.progress_init(message)
+
+    # Set up an undo group on each image, so the operation will be undone in one step.
+    for image in images:
+        pdb.gimp_image_undo_group_start(image)
+
+    try:
+        body()
+
+    except Exception as err:
+        exc_type, exc_obj, exc_tb = sys.exc_info()
+        while exc_tb.tb_next is not None:
+            exc_tb = exc_tb.tb_next
+        gimp.message("Unexpected error at line " + str(exc_tb.tb_lineno) + " : " + str(err))
+
+    # Close the undo groups.
+    for image in images:
+        pdb.gimp_image_undo_group_end(image)
+
+    # End progress.
+    pdb.gimp_progress_end()
+
+
+def register_look(name, title, what, help, date, params, kernel, native=True):
+    """Register the procedures of a look: on the layer, all frames, all layers or images.
+
+    With native, the procedures take a backend option before params.
+    Pipelines have no tables of their own and always take the reference path.
+    """
+    def split(args):
+        """(backend, arguments of kernel) of the arguments after the center."""
+        return (BACKENDS[args[0]], args[1:]) if native else ("reference", args)
+
+    def instagimp_layer(img, layer, center, *args):
+        backend, args = split(args)
+
+        def body():
+            # Filter the layer a row of tiles at a time through its shadow buffer.
+            filter_layers([layer], *kernel(args), center=CENTERS[center], backend=backend)
+        run([img], "Applying " + what + " to " + layer.name + "...", body)
+
+    def instagimp_frames(img, layer, center, *args):
+        from instagimp import regions
+        backend, args = split(args)
+        # Every visible RGB layer is a frame, inside layer groups too.
+        frames = regions.visible_layers(img)
+
+        def body():
+            # Filter every frame, sharing the distance map and the tables.
+            filter_layers(frames, *kernel(args), center=CENTERS[center], backend=backend)
+        run([img], "Applying " + what + " to every frame of " + img.name + "...", body)
+
+    def instagimp_all(img, layer, targets, center, *args):
+        from instagimp import regions
+        backend, args = split(args)
+        # Visible layers of this image, or the active layer of every open image.
+        images = [img] if targets == 0 else gimp.image_list()
+        layers = regions.visible_layers(img) if targets == 0 else regions.active_layers(images)
+
+        def body():
+            # Filter the layers in one stream of strips, each one with its own vignette.
+            stats = filter_layers(layers, *kernel(args), center=CENTERS[center], backend=backend)
+            gimp.message(what + ": " + str(stats))
+        run(images, "Applying " + what + " to " + str(len(layers)) + " layers...", body)
+
+    options = [backend_option(name)] if native else []
+    for suffix, label, menu, extra, function in [
+            ("", title, "", [center_option("layer")], instagimp_layer),
+            ("_frames", title + " (all frames)", "All frames/", [center_option("image")], instagimp_frames),
+            ("_all", title + " (all layers or images)", "All layers or images/",
+             [TARGETS, center_option("layer")], instagimp_all)]:
+        register(
+            "python_fu_instagimp_" + name + suffix,
+            label,
+            help,
+            "JFM",
+            "Open source (BSD 3-clause license)",
+            date,
+            "<Image>/Filters/InstaGIMP/" + menu + title,
+            "RGB, RGB*",
+            extra + options + params,
+            [],
+            function)
+
+
+for name, title, help, date, params in LOOKS:
+    register_look(name, title, title + " filter", help, date, params, look_kernel(name, params))
+
+register_look("pipeline", "Pipeline", "InstaGIMP pipeline", "Several InstaGIMP filters applied in a single pass",
+              "2016", [(PF_STRING, "looks", "Looks", "geneva; andromeda")], pipeline_kernel, native=False)
+
+main()
@@ -0,0 +1,132 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+
+"""Tests of instagimp.batch."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from instagimp import batch, images, kernels
+
+
+class RunTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def path(self, *names):
+        return os.path.join(self.directory, *names)
+
+    def test_default_parameters(self):
+        # The defaults of chicago include sepiacolor, a tuple, passed as
+        # params like the command line does.
+        pixels = np.random.RandomState(0).randint(0, 256, (16, 24, 3)).astype(np.uint8)
+        for name in ("a.png", "b.png"):
+            images.save(self.path(name), pixels)
+        with open(self.path("manifest.txt"), "w") as f:
+            f.write("a.png\n{\"input\": \"b.png\", \"params\": {\"redshift\": 34}}\n")
+
+        stats = batch.run(self.path("manifest.txt"), 0, 1, self.path("out"), self.path("journal"),
+                          jobs=1, filter="chicago", params=kernels.parse_params("chicago", []))
+        self.assertEqual((stats.done, stats.failed), (2, 0))
+        for name in ("a.png", "b.png"):
+            self.assertTrue(os.path.exists(self.path("out", name)))
+
+        # The default redshift and the one given are the same parameters.
+        items = list(batch.read_manifest(self.path("manifest.txt"), filter="chicago"))
+        self.assertEqual(items[0].label, items[1].label)
+
+    def test_save_error(self):
+        pixels = np.zeros((4, 4, 3), np.uint8)
+        with self.assertRaises(ValueError):
+            batch.save_atomic(self.path("out.unknown"), pixels)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_resume(self):
+        images.save(self.path("a.png"), np.zeros((4, 4, 3), np.uint8))
+        with open(self.path("manifest.txt"), "w") as f:
+            f.write("a.png\n")
+        run = lambda **params: batch.run(self.path("manifest.txt"), 0, 1, self.path("out"),
+                                         self.path("journal"), jobs=1, filter="chicago", params=params)
+        self.assertEqual(run().done, 1)
+        self.assertEqual(run().skipped, 1)
+        # Other parameters run the item again.
+        self.assertEqual(run(redshift=10).done, 1)
+
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def read(self, *lines):
+        path = os.path.join(self.directory, "manifest.txt")
+        with open(path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        return list(batch.read_manifest(path, "out", filter="chicago"))
+
+    def test_outputs(self):
+        items = self.read("# comment", "", "a/x.jpg", '{"input": "b.jpg", "output": "c/d.png"}')
+        self.assertEqual([item.name for item in items], [os.path.join("a", "x.jpg"), os.path.join("c", "d.png")])
+        self.assertEqual(items[1].output, os.path.join("out", "c", "d.png"))
+
+    def test_outside(self):
+        for output in (os.path.abspath("x.png"), "../x.png", "a/../../x.png", ".."):
+            with self.assertRaises(ValueError):
+                self.read('{"input": "a.jpg", "output": "%s"}' % output)
+
+    def test_collision(self):
+        with self.assertRaises(ValueError):
+            self.read("../a/x.jpg", "a/x.jpg")
+        with self.assertRaises(ValueError):
+            self.read("a.jpg", '{"input": "b.jpg", "output": "a.jpg"}')
+
+    def test_bad_items(self):
+        for line in ('{"output": "a.jpg"}', '{"input": "a.jpg", "filter": "nope"}',
+                     '{"input": "a.jpg", "params": {"nope": 1}}', '{"input": "a.jpg", "params": {"redshift": [1, 2]}}',
+                     '{"input": "a.jpg", "params": {"sepiacolor": 1}}', "{"):
+            with self.assertRaises(ValueError):
+                self.read(line)
+
+
+class ShardTest(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(batch.parse_shard("2/4"), (2, 4))
+        for text in ("4/4", "-1/4", "0/0", "1", "a/b"):
+            with self.assertRaises(ValueError):
+                batch.parse_shard(text)
+
+    def test_shards(self):
+        names = ["%d.jpg" % i for i in range(200)]
+        shards = [batch.shard_of(name, 4) for name in names]
+        self.assertEqual(set(shards), set(range(4)))
+        self.assertEqual(shards, [batch.shard_of(name, 4) for name in names])
+
+
+if __name__ == "__main__":
+    unittest.main()
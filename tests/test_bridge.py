@@ -0,0 +1,82 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""Tests of the buffers between pixel regions and arrays."""
+
+import unittest
+
+import numpy as np
+
+from instagimp import bridge
+
+
+class Region(object):
+    """A pixel region that takes buffers, as in GIMP 2.10."""
+
+    def __init__(self):
+        self.data = {}
+
+    def __setitem__(self, key, data):
+        self.data[key] = bytes(data)
+
+
+class StringRegion(Region):
+    """A pixel region that only takes strings, as in GIMP 2.8."""
+
+    def __setitem__(self, key, data):
+        if not isinstance(data, bytes):
+            raise TypeError("expected a string")
+        Region.__setitem__(self, key, data)
+
+
+class BridgeTest(unittest.TestCase):
+
+    def setUp(self):
+        bridge.counters.reset()
+
+    def test_view_shares_memory(self):
+        data = bytearray(2 * 3 * 4)
+        array = bridge.view(data, 2, 3, 4)
+        array[1, 2, 3] = 7
+        self.assertEqual(data[-1], 7)
+
+    def test_buffers(self):
+        buffers = bridge.Buffers(3, 4, 5, 3)
+        first = buffers.take()
+        self.assertEqual(first.shape, (4, 5, 3))
+        self.assertEqual(buffers.take(2).shape, (2, 5, 3))
+        buffers.take()
+        # Handed out again after count takes.
+        self.assertTrue(np.shares_memory(buffers.take(), first))
+        self.assertEqual((bridge.counters.allocations, bridge.counters.bytes_allocated), (3, 3 * 4 * 5 * 3))
+
+    def test_assign(self):
+        block = np.arange(24, dtype=np.uint8).reshape(2, 4, 3)
+        for kind, copied in ((Region, 0), (StringRegion, 24)):
+            rgn = kind()
+            bridge.counters.reset()
+            bridge.assign(rgn, "key", block)
+            self.assertEqual(rgn.data["key"], block.tobytes())
+            self.assertEqual(bridge.counters.bytes_copied, copied)
+        self.assertIn(StringRegion, bridge._strings_only)
+        self.assertNotIn(Region, bridge._strings_only)
+
+
+if __name__ == "__main__":
+    unittest.main()
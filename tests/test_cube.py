@@ -0,0 +1,72 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""Tests of the 3D color LUTs of the filters."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from instagimp import cube, kernels
+
+
+class CubeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_sample(self):
+        pixels = cube.test_pixels(8)
+        for name, kernel in kernels.FILTERS.items():
+            self.assertLessEqual(cube.max_error(cube.sample(kernel), kernel, pixels=pixels), 1, name)
+
+    def test_parametric(self):
+        # Only Andromeda has a slope that depends on the colors.
+        lut = cube.sample(kernels.andromeda).parametric()
+        self.assertTrue(all(np.ndim(slope) == 0 for slope in lut.slope))
+        self.assertLessEqual(cube.max_error(cube.sample(kernels.ghost).parametric(), kernels.ghost,
+                                            pixels=cube.test_pixels(8)), 1)
+
+    def test_write_read(self):
+        lut = cube.sample(kernels.geneva, {"brownfusion": 40}, size=17)
+        path = os.path.join(self.tmp, "geneva.cube")
+        lut.write(path)
+        copy = cube.read(path)
+        self.assertEqual((copy.title, copy.size), ("geneva", 17))
+        np.testing.assert_allclose(copy.table, lut.table, atol=1e-3)
+        np.testing.assert_allclose(copy.slope, lut.slope, atol=1e-3)
+        pixels = cube.test_pixels(16)
+        np.testing.assert_array_equal(copy(pixels), lut(pixels))
+
+    def test_not_a_cube_file(self):
+        path = os.path.join(self.tmp, "empty.cube")
+        with open(path, "w") as f:
+            f.write("LUT_3D_SIZE 2\n0 0 0\n")
+        with self.assertRaises(ValueError):
+            cube.read(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
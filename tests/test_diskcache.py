@@ -0,0 +1,113 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+
+"""Tests of instagimp.diskcache."""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from instagimp import diskcache, kernels
+
+
+def lookups(root, count=50):
+    cache = diskcache.ResultCache(root)
+    for _ in range(count):
+        cache.get("missing")
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.cache = diskcache.ResultCache(self.root)
+        self.pixels = np.random.RandomState(0).randint(0, 256, (8, 8, 3)).astype(np.uint8)
+
+    def test_filter(self):
+        calls = []
+
+        def compute(pixels):
+            calls.append(pixels)
+            return kernels.chicago(pixels)
+        for _ in range(3):
+            out = self.cache.filter(kernels.chicago, {}, self.pixels, compute)
+            np.testing.assert_array_equal(out, kernels.chicago(self.pixels))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+        self.cache.filter(kernels.chicago, {"redshift": 40}, self.pixels)
+        self.assertEqual(self.cache.stats()["entries"], 2)
+
+    def test_counters_stay_small(self):
+        for _ in range(1000):
+            self.cache.get("missing")
+        self.assertEqual(self.cache.misses, 1000)
+        self.assertLess(os.path.getsize(os.path.join(self.root, "misses")), 8)
+        self.cache.clear()
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 0))
+
+    def test_shared_counters(self):
+        processes = [multiprocessing.Process(target=lookups, args=(self.root,)) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.misses, 200)
+
+    def test_earlier_counters(self):
+        with open(os.path.join(self.root, "hits"), "wb") as f:
+            f.write(b"." * 5)
+        self.cache.put("key", self.pixels)
+        self.cache.get("key")
+        self.assertEqual(self.cache.hits, 6)
+
+    def test_evict(self):
+        size = None
+        for i in range(5):
+            self.cache.put("key%d" % i, self.pixels)
+            size = size or self.cache.stats()["bytes"]
+        self.cache.evict(2 * size)
+        self.assertEqual(self.cache.get("key0"), None)
+        self.assertEqual(self.cache.stats()["entries"], 2)
+
+    def test_truncated(self):
+        self.cache.put("key", self.pixels)
+        with open(os.path.join(self.root, "key" + diskcache.SUFFIX), "r+b") as f:
+            f.truncate(20)
+        self.assertEqual(self.cache.get("key"), None)
+
+
+class SignatureTest(unittest.TestCase):
+
+    def test_defaults(self):
+        # Defaults given or not, as ints or floats, are the same parameters.
+        self.assertEqual(diskcache.signature(kernels.chicago, {}),
+                         diskcache.signature(kernels.chicago, {"redshift": 34, "sepiacolor": [214, 240, 201]}))
+        self.assertNotEqual(diskcache.signature(kernels.chicago, {}),
+                            diskcache.signature(kernels.chicago, {"redshift": 35}))
+
+
+if __name__ == "__main__":
+    unittest.main()
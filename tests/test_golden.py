@@ -0,0 +1,130 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+
+"""The plug-ins against their golden images and the original per-pixel loops."""
+
+import math
+import unittest
+
+import numpy as np
+
+import bench
+from instagimp import kernels, luts, vignette
+
+
+def checkColor(color):
+    if color > 255:
+        return 255
+    if color < 0:
+        return 0
+    return color
+
+
+# The loops of the original plug-ins, minus the GIMP calls.
+
+def original_ghost(pixels, alpha=1.975, beta=-100, whiteoutside=50):
+    height, width = pixels.shape[:2]
+    out = pixels.copy()
+    dmax = math.sqrt(math.pow(width, 2) + math.pow(height, 2))
+    for x in range(width):
+        for y in range(height):
+            dx = math.fabs(x - (width / 2.0))
+            dy = math.fabs(y - (height / 2.0))
+            distance = math.sqrt(math.pow(dx, 2) + math.pow(dy, 2))
+            pixel = [int(v) for v in pixels[y, x]]
+            r = alpha * pixel[0] + beta
+            g = alpha * pixel[1] + beta
+            b = alpha * pixel[2] + beta
+            average = (r + g + b) / 3.0
+            r = g = b = average
+            r += ((float(whiteoutside) / dmax) * distance)
+            g += ((float(whiteoutside) / dmax) * distance)
+            b += ((float(whiteoutside) / dmax) * distance)
+            out[y, x, :3] = (int(checkColor(r)), int(checkColor(g)), int(checkColor(b)))
+    return out
+
+
+def original_geneva(pixels, alpha=1.775, beta=-40, brownfusion=25, blackoutside=100):
+    height, width = pixels.shape[:2]
+    out = pixels.copy()
+    dmax = math.sqrt(math.pow(width, 2) + math.pow(height, 2))
+    for x in range(width):
+        for y in range(height):
+            dx = math.fabs(x - (width / 2.0))
+            dy = math.fabs(y - (height / 2.0))
+            distance = math.sqrt(math.pow(dx, 2) + math.pow(dy, 2))
+            pixel = [int(v) for v in pixels[y, x]]
+            r = alpha * pixel[0] + beta
+            g = alpha * pixel[1] + beta
+            b = alpha * pixel[2] + beta
+            average = (r + g + b) / 3.0
+            r = average
+            g = average
+            b = average + brownfusion
+            r -= ((blackoutside / dmax) * distance)
+            g -= ((blackoutside / dmax) * distance)
+            b -= ((blackoutside / dmax) * distance)
+            out[y, x, :3] = (int(checkColor(r)), int(checkColor(g)), int(checkColor(b)))
+    return out
+
+
+class GoldenTest(unittest.TestCase):
+
+    def test_golden_images(self):
+        self.assertEqual(bench.check_golden(bench.load_plugins()), [])
+
+    def test_original_loops(self):
+        width, height = bench.GOLDEN_SIZE
+        test = np.frombuffer(bytes(bench.test_image(width, height, 4)), np.uint8).reshape(height, width, 4)
+        for original, kernel in ((original_ghost, kernels.ghost), (original_geneva, kernels.geneva)):
+            # The same on the test image of the golden images.
+            np.testing.assert_array_equal(kernel(test), original(test))
+            # Within one level of rounding on others.
+            for seed in range(4):
+                pixels = np.random.RandomState(seed).randint(0, 256, (height, width, 3)).astype(np.uint8)
+                difference = np.abs(kernel(pixels).astype(int) - original(pixels))
+                self.assertLessEqual(difference.max(), 1)
+
+    def test_sticker_tiles(self):
+        width, height = bench.STICKER_SIZE
+        data = bench.test_image(width, height, 4, True)
+        test = np.frombuffer(bytes(data), np.uint8).reshape(height, width, 4)
+        plugins = bench.load_plugins()
+        for name, kernel in kernels.FILTERS.items():
+            # Row by row, below the size where tiles are scanned.
+            expected = np.concatenate([kernel(test[y:y + 1], vignette.window(width, height, 0, y, width, 1))
+                                       for y in range(height)])
+            # Fully transparent tiles keep their input colors.
+            transparent = luts.scan(test)[0]
+            for i, j in zip(*np.nonzero(transparent)):
+                tile = (slice(i * luts.TILE, (i + 1) * luts.TILE), slice(j * luts.TILE, (j + 1) * luts.TILE))
+                expected[tile] = test[tile]
+            layer, _ = bench.run(plugins[name], width, height, 4, data)
+            output = np.frombuffer(bytes(layer.data), np.uint8).reshape(height, width, 4)
+            np.testing.assert_array_equal(output, expected, name)
+            # Transparent pixels of the other tiles are filtered.
+            mixed = (test[..., 3] == 0) & ~np.kron(transparent, np.ones((luts.TILE, luts.TILE), bool))
+            self.assertTrue(mixed.any())
+            self.assertTrue((output[mixed] != test[mixed]).any(), name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+
+"""Tests of instagimp.kernels."""
+
+import unittest
+
+import numpy as np
+
+from instagimp import cube, kernels
+
+
+class ParamsTest(unittest.TestCase):
+
+    def test_defaults(self):
+        params = kernels.parse_params("chicago", [])
+        self.assertEqual(list(params), ["whiteoutside", "sepiacolor", "redshift"])
+        self.assertEqual(params["sepiacolor"], (214, 240, 201))
+
+    def test_values(self):
+        params = kernels.parse_params("chicago", ["redshift=40", "sepiacolor=200,220,180"])
+        self.assertEqual((params["redshift"], params["sepiacolor"]), (40.0, (200.0, 220.0, 180.0)))
+
+    def test_bad_values(self):
+        for name, assignment in (("chicago", "sepiacolor=1,2"), ("chicago", "sepiacolor=200"),
+                                 ("ghost", "alpha=1,2"), ("ghost", "alpha=x"), ("ghost", "alpha"),
+                                 ("ghost", "gamma=1"), ("nope", "alpha=1")):
+            with self.assertRaises(ValueError) as context:
+                kernels.parse_params(name, [assignment])
+            self.assertIn(assignment.partition("=")[0] if name != "nope" else name, str(context.exception))
+
+
+class KernelTest(unittest.TestCase):
+
+    def test_shapes(self):
+        pixels = cube.test_pixels(8)
+        rgba = np.dstack([pixels, np.full(pixels.shape[:2], 128, np.uint8)])
+        for name, kernel in kernels.FILTERS.items():
+            out = kernel(rgba)
+            self.assertEqual((out.shape, out.dtype), (rgba.shape, np.uint8), name)
+            np.testing.assert_array_equal(out[..., 3], rgba[..., 3])
+
+    def test_pixel(self):
+        # Single pixels, the path without NumPy, give the same colors.
+        pixels = np.random.RandomState(0).randint(0, 256, (1, 1, 3)).astype(np.uint8)
+        for name, kernel in kernels.FILTERS.items():
+            pixel = tuple(int(v) for v in pixels[0, 0])
+            self.assertEqual(tuple(kernel(pixel, distance=0.0)[:3]),
+                             tuple(kernel(pixels, distance=np.zeros((1, 1)))[0, 0]), name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+
+"""Tests of instagimp.native against a pdb recording and running its calls."""
+
+import unittest
+
+import numpy as np
+
+import fakegimpfu
+from instagimp import cube, kernels, native, vignette
+
+
+class Layer(object):
+
+    def __init__(self, image, pixels, offsets=(0, 0)):
+        self.image = image
+        self.pixels = pixels
+        self.height, self.width = pixels.shape[:2]
+        self.offsets = offsets
+
+
+class Image(object):
+
+    def __init__(self, width, height):
+        self.width, self.height = width, height
+        # From the top, like GIMP's item positions.
+        self.layers = []
+
+
+class Procedure(object):
+
+    def __init__(self, pdb, name, function):
+        self.pdb, self.proc_name, self.function = pdb, name.replace("_", "-"), function
+
+    def __call__(self, *args):
+        self.pdb.calls.append(self.proc_name)
+        return self.function(*args)
+
+
+class RecordingPdb(object):
+    """The procedures native.apply() uses, run on NumPy arrays with the
+    8-bit arithmetic of GIMP 2.8 that native.simulate() models. calls
+    records the names of the procedures called, in order. gimp28 leaves
+    out the GIMP 2.10 names of curves and desaturate."""
+
+    def __init__(self, gimp28=False):
+        self.calls = []
+        self.gimp28 = gimp28
+
+    def __getattr__(self, name):
+        if name.startswith("gimp_drawable_") and self.gimp28:
+            raise AttributeError(name)
+        return Procedure(self, name, getattr(self, "_" + name))
+
+    def _gimp_drawable_curves_explicit(self, drawable, channel, count, values):
+        self._gimp_curves_explicit(drawable, channel, count, [int(round(v * 255)) for v in values])
+
+    def _gimp_curves_explicit(self, drawable, channel, count, values):
+        assert count == len(values) == 256
+        c = native.HISTOGRAM_CHANNELS.index(channel)
+        drawable.pixels[..., c] = np.array(values, np.uint8)[drawable.pixels[..., c]]
+
+    def _gimp_drawable_desaturate(self, drawable, mode):
+        assert mode == native.DESATURATE_AVERAGE
+        average = (drawable.pixels[..., :3].astype(np.int32).sum(axis=-1) + 1) // 3
+        drawable.pixels[..., :3] = average[..., np.newaxis]
+
+    _gimp_desaturate_full = _gimp_drawable_desaturate
+
+    def _gimp_layer_copy(self, layer, add_alpha):
+        return Layer(layer.image, layer.pixels.copy(), layer.offsets)
+
+    def _gimp_layer_new(self, image, width, height, type, name, opacity, mode):
+        return Layer(image, np.zeros((height, width, 3), np.uint8))
+
+    def _gimp_layer_set_offsets(self, layer, x, y):
+        layer.offsets = (x, y)
+
+    def _gimp_image_get_item_position(self, image, item):
+        return image.layers.index(item)
+
+    def _gimp_image_insert_layer(self, image, layer, parent, position):
+        image.layers.insert(position, layer)
+
+    def _gimp_context_push(self):
+        self.colors = []
+
+    def _gimp_context_pop(self):
+        pass
+
+    def _gimp_context_set_foreground(self, color):
+        self.colors.append(color)
+
+    def _gimp_context_set_background(self, color):
+        self.colors.append(color)
+
+    def _gimp_edit_blend(self, drawable, blend_mode, paint_mode, gradient_type, opacity, offset, repeat,
+                         reverse, supersample, max_depth, threshold, dither, x1, y1, x2, y2):
+        assert gradient_type == native.GRADIENT_RADIAL and self.colors == [(0, 0, 0), (255, 255, 255)]
+        # 255 at the radius, computed like vignette.distance().
+        y, x = np.mgrid[:drawable.height, :drawable.width]
+        distance = np.sqrt((x - x1) ** 2 + (y - y1) ** 2) / (2 * (x2 - x1))
+        drawable.pixels[..., :3] = np.clip(np.rint(distance * 510), 0, 255)[..., np.newaxis]
+
+    def _gimp_layer_set_mode(self, layer, mode):
+        layer.mode = mode
+
+    def _gimp_selection_is_empty(self, image):
+        return True
+
+    def _gimp_image_merge_down(self, image, layer, merge_type):
+        i = image.layers.index(layer)
+        below = image.layers[i + 1]
+        sign = 1 if layer.mode == native.ADDITION_MODE else -1
+        merged = Layer(image, np.clip(below.pixels.astype(np.int32) + sign * layer.pixels.astype(np.int32), 0, 255).astype(np.uint8),
+                       below.offsets)
+        image.layers[i:i + 2] = [merged]
+        return merged
+
+
+class NativeTest(unittest.TestCase):
+
+    pixels = cube.test_pixels(4)
+
+    def run_native(self, kernel, pdb):
+        height, width = self.pixels.shape[:2]
+        image = Image(width, height)
+        layer = Layer(image, self.pixels.copy())
+        image.layers.append(layer)
+        result = native.apply(pdb, image, layer, kernel)
+        self.assertEqual(image.layers, [result])
+        return result.pixels
+
+    def test_simulate(self):
+        # The calls do what simulate() models, on GIMP 2.10 and 2.8. The
+        # gradient drawn from its end points can round a few pixels to the
+        # next level compared with the distance map.
+        distance = vignette.window(self.pixels.shape[1], self.pixels.shape[0])
+        for name, kernel in kernels.FILTERS.items():
+            expected = native.simulate(native.Plan.of(kernel), self.pixels, distance).astype(int)
+            for gimp28 in (False, True):
+                difference = np.abs(self.run_native(kernel, RecordingPdb(gimp28)) - expected)
+                self.assertLessEqual(difference.max(), 1, name)
+                self.assertLess(np.count_nonzero(difference), 100, name)
+
+    def test_calls(self):
+        pdb = RecordingPdb()
+        self.run_native(kernels.chicago, pdb)
+        curves, desaturate = "gimp-drawable-curves-explicit", "gimp-drawable-desaturate"
+        gradient = ["gimp-layer-new", "gimp-layer-set-offsets", "gimp-image-get-item-position",
+                    "gimp-image-insert-layer", "gimp-context-push", "gimp-context-set-foreground",
+                    "gimp-context-set-background", "gimp-edit-blend", "gimp-context-pop"]
+        merge = ["gimp-layer-set-mode", "gimp-selection-is-empty", "gimp-image-merge-down"]
+        # Average and sepia curves, then the whiteoutside gradient added.
+        self.assertEqual(pdb.calls, [desaturate] + [curves] * 3 + gradient + [curves] * 3 + merge)
+
+        # Value curves, a copy of the layer desaturated and added, then the
+        # blackoutside gradient subtracted, with the GIMP 2.8 procedures.
+        pdb = RecordingPdb(gimp28=True)
+        self.run_native(kernels.andromeda, pdb)
+        curves, desaturate = "gimp-curves-explicit", "gimp-desaturate-full"
+        copy = ["gimp-layer-copy", "gimp-image-get-item-position", "gimp-image-insert-layer"]
+        self.assertEqual(pdb.calls, copy + [curves] * 3 + [desaturate] + [curves] * 3 + merge
+                         + gradient + [curves] * 3 + merge)
+
+    def test_error_bounds(self):
+        # The bounds given by the native option of the plug-in.
+        fakegimpfu.install()
+        import instagimp_filters
+        for name, kernel in kernels.FILTERS.items():
+            self.assertEqual(native.error_bound(kernel), instagimp_filters.NATIVE_ERRORS[name], name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+
+"""Tests of instagimp.pipeline."""
+
+import itertools
+import unittest
+
+import numpy as np
+
+from instagimp import cube, kernels, pipeline
+
+
+class PipelineTest(unittest.TestCase):
+
+    pixels = cube.test_pixels(4)
+
+    def test_single_look(self):
+        for name, kernel in kernels.FILTERS.items():
+            np.testing.assert_array_equal(pipeline.Pipeline([(name, {})])(self.pixels), kernel(self.pixels))
+
+    def test_pairs(self):
+        # The truncations between the plug-ins, amplified by the second look.
+        for first, second in itertools.product(kernels.FILTERS, repeat=2):
+            fused = pipeline.Pipeline([(first, {}), (second, {})])(self.pixels)
+            sequential = kernels.FILTERS[second](kernels.FILTERS[first](self.pixels))
+            bound = 4 if (first, second) == ("sanfrancisco", "andromeda") else 3
+            self.assertLessEqual(np.abs(fused.astype(int) - sequential).max(), bound, (first, second))
+
+    def test_parse(self):
+        chain = pipeline.parse("geneva; andromeda whitecenter=20")
+        self.assertEqual([name for name, params in chain.steps], ["geneva", "andromeda"])
+        self.assertEqual(chain.steps[1][1]["whitecenter"], 20)
+        for text in ("", " ; ", "nope", "geneva beta"):
+            with self.assertRaises(ValueError):
+                pipeline.parse(text)
+
+
+if __name__ == "__main__":
+    unittest.main()
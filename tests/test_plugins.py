@@ -0,0 +1,89 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+
+"""The registered procedures of instagimp_filters.py, run on fakegimpfu."""
+
+import unittest
+
+import numpy as np
+
+import bench
+import fakegimpfu
+from instagimp import kernels, vignette
+
+
+def layer(seed, bpp=3, **options):
+    pixels = np.random.RandomState(seed).randint(0, 256, (24, 32, bpp)).astype(np.uint8)
+    result = fakegimpfu.Layer(32, 24, bpp, pixels.tobytes(), **options)
+    return result, pixels
+
+
+def data(layer):
+    return np.frombuffer(bytes(layer.data), np.uint8).reshape(layer.height, layer.width, layer.bpp)
+
+
+class FramesTest(unittest.TestCase):
+
+    plugins = bench.load_plugins(["ghost_frames"])
+
+    def test_visible_rgb_layers(self):
+        (visible, pixels), (grouped, grouped_pixels) = layer(0), layer(1)
+        hidden, hidden_pixels = layer(2)
+        hidden.visible = False
+        gray, gray_pixels = layer(3, bpp=1)
+        group = fakegimpfu.LayerGroup([grouped])
+        fakegimpfu.Image([visible, group, hidden, gray])
+
+        function, params = self.plugins["ghost_frames"]
+        function(visible.image, visible, *fakegimpfu.defaults(params))
+        np.testing.assert_array_equal(data(visible), kernels.ghost(pixels))
+        np.testing.assert_array_equal(data(grouped), kernels.ghost(grouped_pixels))
+        np.testing.assert_array_equal(data(hidden), hidden_pixels)
+        np.testing.assert_array_equal(data(gray), gray_pixels)
+
+
+class CenterTest(unittest.TestCase):
+
+    plugins = bench.load_plugins(["ghost", "ghost_frames", "ghost_all"])
+
+    def run_ghost(self, name, center):
+        """Run procedure name with the center option, on a layer at (8, 4) of
+        a larger image."""
+        result, pixels = layer(4)
+        result.offsets = (8, 4)
+        fakegimpfu.Image([result], width=64, height=48)
+        function, params = self.plugins[name]
+        args = fakegimpfu.defaults(params)
+        args[[param[1] for param in params].index("center")] = center
+        function(result.image, result, *args)
+        return data(result), pixels
+
+    def test_centers(self):
+        for name in ("ghost", "ghost_frames", "ghost_all"):
+            # Options in the order layer, selection, image.
+            out, pixels = self.run_ghost(name, 0)
+            np.testing.assert_array_equal(out, kernels.ghost(pixels, distance=vignette.window(32, 24)))
+            out, pixels = self.run_ghost(name, 2)
+            np.testing.assert_array_equal(out, kernels.ghost(pixels, distance=vignette.window(64, 48, 8, 4, 32, 24)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+
+"""Tests of instagimp.precision on drawables of the gimpfu stand-in."""
+
+import unittest
+
+import numpy as np
+
+import fakegimpfu
+from instagimp import bridge, kernels, precision, regions
+
+
+def layer(pixels, image_precision=None):
+    height, width, channels = pixels.shape
+    result = fakegimpfu.Layer(width, height, channels * pixels.dtype.itemsize, pixels.tobytes(),
+                              has_alpha=channels == 4)
+    fakegimpfu.Image([result], precision=image_precision)
+    return result
+
+
+def data(result, dtype):
+    return np.frombuffer(bytes(result.data), dtype).reshape(result.height, result.width, -1)
+
+
+class OfLayerTest(unittest.TestCase):
+
+    def test_precision(self):
+        f = precision.of_layer(layer(np.zeros((2, 2, 4), "=u2"), 250))
+        self.assertEqual((f.component, f.linear, f.channels), ("u16", False, 4))
+        f = precision.of_layer(layer(np.zeros((2, 2, 3), "=f4"), 600))
+        self.assertEqual((f.component, f.linear, f.channels), ("float", True, 3))
+
+    def test_guess(self):
+        f = precision.of_layer(layer(np.zeros((2, 2, 3), "=f4")))
+        self.assertEqual((f.component, f.linear), ("float", True))
+        f = precision.of_layer(layer(np.zeros((2, 2, 4), "u1")))
+        self.assertEqual((f.component, f.linear), ("u8", False))
+
+    def test_8_bit_data_of_high_precision_image(self):
+        # Plug-ins that did not enable high precision get 8-bit pixel regions.
+        pixels = np.random.RandomState(0).randint(0, 256, (60, 80, 4)).astype(np.uint8)
+        for image_precision in (250, 650):
+            result = layer(pixels, image_precision)
+            f = precision.of_layer(result)
+            self.assertEqual((f.component, f.linear), ("u8", False))
+            regions.apply(result, kernels.chicago, {}, workers=1)
+            np.testing.assert_array_equal(data(result, np.uint8), kernels.chicago(pixels))
+
+
+class FormatTest(unittest.TestCase):
+
+    def test_u16_round_trip(self):
+        pixels = np.random.RandomState(1).randint(0, 65536, (4, 5, 3)).astype("=u2")
+        f = precision.Format("u16", linear=False)
+        decoded = f.decode(pixels.tobytes(), 4, 5)
+        self.assertEqual(decoded.dtype, np.float32)
+        np.testing.assert_array_equal(f.encode(decoded), pixels)
+
+    def test_linear_round_trip(self):
+        pixels = np.linspace(0, 1, 60, dtype=np.float32).reshape(4, 5, 3)
+        f = precision.Format("float", linear=True)
+        encoded = f.encode(f.decode(pixels.tobytes(), 4, 5))
+        np.testing.assert_allclose(encoded, pixels, atol=1e-5)
+
+    def test_float_perceptual_without_copies(self):
+        pixels = np.random.RandomState(2).rand(64, 64, 4).astype(np.float32)
+        result = layer(pixels, 650)
+        bridge.counters.reset()
+        regions.apply(result, kernels.chicago, {}, workers=1)
+        self.assertEqual(bridge.counters.per_megapixel(64 * 64)[2], 0)
+        np.testing.assert_array_equal(data(result, np.float32), kernels.chicago(pixels))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""Tests of the strips and memory budget of instagimp.regions."""
+
+import unittest
+
+import numpy as np
+
+import fakegimpfu
+from instagimp import bridge, kernels, regions, stream
+
+
+class BudgetTest(unittest.TestCase):
+
+    def test_within_budget(self):
+        for width in (256, 1000, 4096):
+            for workers in (1, 4, 8):
+                for max_bytes in (1 << 20, 4 << 20, 64 << 20, regions.MAX_BYTES):
+                    window, rows = regions.budget(width, workers, max_bytes)
+                    self.assertTrue(1 <= window <= 2 * workers)
+                    self.assertLessEqual(rows, regions.TILE_HEIGHT)
+                    self.assertLessEqual((window + 1) * rows * width * stream.BYTES_PER_PIXEL, max_bytes)
+
+    def test_default(self):
+        self.assertEqual(regions.budget(1024, 8), (16, regions.TILE_HEIGHT))
+        self.assertEqual(regions.budget(4096, 8), (15, regions.TILE_HEIGHT))
+
+    def test_short_strips(self):
+        # Rows of tiles are only split when two of them do not fit.
+        self.assertEqual(regions.budget(4096, 8, 4 << 20), (1, 8))
+
+
+class ApplyTest(unittest.TestCase):
+
+    def test_max_bytes(self):
+        # No transparent pixels, whose tiles are shorter with short strips.
+        pixels = np.random.RandomState(0).randint(1, 256, (300, 256, 4)).astype(np.uint8)
+        layer = fakegimpfu.Layer(256, 300, 4, pixels.tobytes())
+        fakegimpfu.Image([layer])
+        bridge.counters.reset()
+        regions.apply(layer, kernels.chicago, {}, workers=4, max_bytes=1 << 20)
+        # A ring of two strips of 32 rows.
+        self.assertEqual(bridge.counters.bytes_allocated, 2 * 32 * 256 * 4)
+        result = np.frombuffer(bytes(layer.data), np.uint8).reshape(300, 256, 4)
+        np.testing.assert_array_equal(result, kernels.chicago(pixels))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+
+"""Tests of instagimp.service over HTTP, with a pool of threads."""
+
+import json
+import threading
+import unittest
+
+import numpy as np
+
+from instagimp import images, kernels, service
+
+try:
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+except ImportError:
+    from urllib2 import HTTPError, Request, urlopen
+
+
+class ServiceTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.service = service.Service(("127.0.0.1", 0), workers=2, kind="thread")
+        thread = threading.Thread(target=cls.service.serve_forever)
+        thread.daemon = True
+        thread.start()
+        cls.pixels = np.random.RandomState(0).randint(0, 256, (12, 16, 3)).astype(np.uint8)
+        cls.body = images.encode(cls.pixels, "png")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.service.shutdown()
+        cls.service.close()
+
+    def post(self, path, body=None):
+        url = "http://127.0.0.1:%d%s" % (self.service.server_address[1], path)
+        try:
+            response = urlopen(Request(url, self.body if body is None else body))
+            return response.getcode(), response.headers["Content-Type"], response.read()
+        except HTTPError as err:
+            return err.code, err.headers["Content-Type"], err.read()
+
+    def test_filter(self):
+        status, content_type, data = self.post("/filters/chicago?redshift=40")
+        self.assertEqual((status, content_type), (200, "image/png"))
+        pixels, format = images.decode(data)
+        np.testing.assert_array_equal(pixels, kernels.chicago(self.pixels, redshift=40))
+        status, content_type, _ = self.post("/filters/chicago?format=jpg")
+        self.assertEqual((status, content_type), (200, "image/jpeg"))
+
+    def test_errors(self):
+        for path, expected in (("/filters/nope", 404), ("/other", 404),
+                               ("/filters/chicago?sepiacolor=1,2", 400), ("/filters/chicago?sepiacolor=200", 400),
+                               ("/filters/ghost?alpha=1,2", 400), ("/filters/ghost?alpha=x", 400),
+                               ("/filters/chicago?format=xyz", 400)):
+            status, content_type, data = self.post(path)
+            self.assertEqual(status, expected, path)
+            self.assertIn("error", json.loads(data.decode("utf-8")))
+        self.assertEqual(self.post("/filters/chicago", b"not an image")[0], 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+#
+# -------------------------------------------------------------------------------------
+#
+# Copyright (c) 2017, Nils Schaetti <n.schaetti@gmail.com>
+#
+# This file is part of InstaGIMP.  InstaGIMP is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""Tests of the filter specs and their compiler."""
+
+import json
+import unittest
+
+import numpy as np
+
+from instagimp import kernels, spec
+
+
+class SpecTest(unittest.TestCase):
+
+    def test_json_round_trip(self):
+        pixels = np.random.RandomState(0).randint(0, 256, (40, 50, 3)).astype(np.uint8)
+        for name, original in spec.SPECS.items():
+            copy = spec.Spec.from_dict(json.loads(json.dumps(original.to_dict())))
+            # Under another name, so that its tables do not come from the cache.
+            copy.name = "copy of " + name
+            self.assertEqual(list(copy.params), list(original.params))
+            kernel = kernels.from_spec(copy)
+            np.testing.assert_array_equal(kernel(pixels), kernels.FILTERS[name](pixels))
+
+    def test_stages(self):
+        # 2 * 100 - 20, 30 more red, 30 less blue outside and 20 more at the center.
+        tables = spec.Spec("test", [("alpha", 2), ("red", 30)],
+                           [{"stage": "gain", "alpha": "alpha", "beta": -20},
+                            {"stage": "tint", "red": "red"},
+                            {"stage": "outside", "amount": "-red", "channels": ["blue"]},
+                            {"stage": "center", "amount": 20}]).tables()
+        pixels = np.full((1, 1, 3), 100, np.uint8)
+        np.testing.assert_array_equal(kernels.luts.apply(tables, pixels, 0.0), [[[230, 200, 200]]])
+        np.testing.assert_array_equal(kernels.luts.apply(tables, pixels, 1.0), [[[210, 180, 150]]])
+
+    def test_parameters(self):
+        ghost = spec.SPECS["ghost"]
+        self.assertIs(ghost.tables(), ghost.tables(alpha=1.975, beta=-100, whiteoutside=50))
+        self.assertIsNot(ghost.tables(), ghost.tables(2.0))
+        with self.assertRaises(TypeError):
+            ghost.tables(gamma=1)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            spec.Spec("test", [], [{"stage": "gain", "alpha": "alpha"}]).tables()
+        with self.assertRaises(ValueError):
+            spec.Spec("test", [], [{"stage": "blur"}]).tables()
+
+
+if __name__ == "__main__":
+    unittest.main()